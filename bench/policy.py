@@ -0,0 +1,98 @@
+"""
+Benchmark is_permitted: the compiled policy against walking the raw
+records the way we used to. Needs no DB: the policy is compiled from
+temp_recs, padded out with more features and users.
+    python bench/policy.py [number of calls]
+Last run, 1M calls:
+    user list:          5.1us walking, 0.70us compiled
+    user list + login: 13.7us walking, 8.5us compiled
+The login check verifies a signed session token (HMAC-SHA256),
+which costs about 7.7us and dominates that path: compiling the
+policy still saves the same ~5us of walking either way.
+"""
+import sys
+import timeit
+
+import security.security as sec
+import security.tokens as tkn
+
+DEFAULT_NUM_CALLS = 1_000_000
+NUM_FEATURES = 50
+NUM_USERS = 500
+
+
+def make_recs() -> dict:
+    users = [f'user{i}@nyu.edu' for i in range(NUM_USERS)]
+    recs = {f'feature{i}': {
+        sec.READ: {
+            sec.USER_LIST: users + [sec.GOOD_USER_ID],
+        },
+        sec.UPDATE: {
+            sec.USER_LIST: users + [sec.GOOD_USER_ID],
+            sec.CHECKS: {sec.LOGIN: True},
+        },
+    } for i in range(NUM_FEATURES)}
+    return {**recs, **sec.temp_recs}
+
+
+def walk_recs(recs: dict, feature_name: str, action: str,
+              user_id: str, **kwargs) -> bool:
+    """
+    What is_permitted used to do on every call.
+    """
+    prot = recs.get(feature_name)
+    if prot is None:
+        return True
+    if action not in prot:
+        return True
+    if sec.USER_LIST in prot[action]:
+        if user_id not in prot[action][sec.USER_LIST]:
+            return False
+    if sec.CHECKS not in prot[action]:
+        return True
+    for check in prot[action][sec.CHECKS]:
+        if check not in sec.CHECK_FUNCS:
+            raise ValueError(f'Bad check passed to is_permitted: {check}')
+        if not sec.CHECK_FUNCS[check](user_id, **kwargs):
+            return False
+    return True
+
+
+def per_call_ns(stmt, num_calls: int) -> float:
+    return min(timeit.repeat(stmt, number=num_calls, repeat=3)) \
+        / num_calls * 1e9
+
+
+def main():
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_CALLS
+    recs = make_recs()
+    sec.policy = sec.Policy(recs)
+    sec.policy_checked = float('inf')  # no version checks: no DB here
+    feature = f'feature{NUM_FEATURES - 1}'
+    tkn.secret = b'bench only'  # any key will do for timing
+    key = tkn.issue(sec.GOOD_USER_ID)
+    tkn.revoked.start = lambda: None  # no revocations to load: no DB
+
+    print(f'{NUM_FEATURES} features, {NUM_USERS} users per feature,'
+          + f' {num_calls} calls')
+    # a user list alone shows the policy's own cost;
+    # a login check adds what the check itself costs
+    for action, label in [(sec.READ, 'user list'),
+                          (sec.UPDATE, 'user list + login')]:
+        def walked():
+            walk_recs(recs, feature, action, sec.GOOD_USER_ID,
+                      login_key=key)
+
+        def compiled():
+            sec.is_permitted(feature, action, sec.GOOD_USER_ID,
+                             login_key=key)
+
+        print(f'{label}:')
+        print(f'  walking records: {per_call_ns(walked, num_calls):8.0f}'
+              + ' ns/call')
+        print(f'  compiled policy: {per_call_ns(compiled, num_calls):8.0f}'
+              + ' ns/call')
+
+
+if __name__ == '__main__':
+    main()
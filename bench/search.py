@@ -0,0 +1,78 @@
+"""
+Benchmark manuscript search: the text index against the old regex scan.
+Seeds a throwaway database, so it is safe to run against a dev Mongo:
+    python bench/search.py [number of manuscripts]
+"""
+import random
+import sys
+import time
+
+import data.db_connect as dbc
+import data.indexes as idx
+import data.manuscripts as manu
+
+BENCH_DB = 'benchDB'
+DEFAULT_NUM_MANUS = 20_000
+NUM_QUERIES = 50
+WORDS = ('python', 'module', 'import', 'journal', 'network', 'graph',
+         'learning', 'compiler', 'database', 'index', 'search', 'query',
+         'parallel', 'cache', 'memory', 'protocol', 'security', 'model')
+AUTHORS = ('Eugene Callahan', 'Aya Elfettahi', 'Kaitlyn Huynh',
+           'Melanie Andrade', 'Vivian Hertz')
+
+
+def random_words(num: int) -> str:
+    return ' '.join(random.choice(WORDS) for _ in range(num))
+
+
+def seed(num_manus: int):
+    coll = dbc.get_collection(manu.MANU_COLLECT, BENCH_DB)
+    coll.drop()
+    coll.insert_many([{
+        manu.TITLE: f'{random_words(5)} {i}',
+        manu.AUTHOR: random.choice(AUTHORS),
+        manu.ABSTRACT: random_words(60),
+        manu.CURR_STATE: manu.SUBMITTED,
+        manu.REFEREES: [],
+    } for i in range(num_manus)])
+    for spec in idx.INDEXES[manu.MANU_COLLECT]:
+        coll.create_index(spec[idx.KEYS], name=spec[idx.NAME],
+                          **spec.get(idx.OPTIONS, {}))
+
+
+def time_queries(run_query) -> float:
+    """
+    Returns the mean seconds per query.
+    """
+    queries = [random.choice(WORDS) for _ in range(NUM_QUERIES)]
+    start = time.perf_counter()
+    for query in queries:
+        run_query(query)
+    return (time.perf_counter() - start) / NUM_QUERIES
+
+
+def main():
+    num_manus = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_NUM_MANUS
+    seed(num_manus)
+    coll = dbc.get_collection(manu.MANU_COLLECT, BENCH_DB)
+    projection = {field: 1 for field in manu.SUMMARY_FIELDS}
+
+    def regex_search(query):
+        return list(coll.find(manu.regex_search_filter(query), projection))
+
+    def text_search(query):
+        return list(coll.find(manu.text_search_filter(query),
+                              {**projection, manu.SCORE: manu.TEXT_SCORE})
+                    .sort([(manu.SCORE, manu.TEXT_SCORE)])
+                    .limit(manu.SEARCH_LIMIT))
+
+    regex_secs = time_queries(regex_search)
+    text_secs = time_queries(text_search)
+    print(f'{num_manus} manuscripts, {NUM_QUERIES} queries each')
+    print(f'regex scan:  {regex_secs * 1000:8.2f} ms/query')
+    print(f'text index:  {text_secs * 1000:8.2f} ms/query')
+    dbc.get_collection(manu.MANU_COLLECT, BENCH_DB).drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+This module stores manuscript bodies: the text and any attachments.
+They live in GridFS, split into chunks, so manuscript documents stay
+small, metadata reads never touch a body, and a body can be bigger
+than Mongo's 16MB document limit.
+"""
+import gridfs
+
+import data.db_connect as dbc
+
+BODY_BUCKET = 'manuscript_bodies'
+CHUNK_SIZE = 255 * 1024  # bytes; also how much we stream at a time
+TEXT_NAME = 'text'
+ENCODING = 'utf-8'
+
+# metadata fields
+MANU_ID = 'manu_id'
+NAME = 'name'
+CONTENT_TYPE = 'content_type'
+LENGTH = 'length'
+UPLOADED = 'uploaded'
+
+TEXT_TYPE = 'text/plain; charset=utf-8'
+DEFAULT_TYPE = 'application/octet-stream'
+
+
+def get_bucket() -> gridfs.GridFSBucket:
+    return gridfs.GridFSBucket(dbc.get_db(), bucket_name=BODY_BUCKET,
+                               chunk_size_bytes=CHUNK_SIZE)
+
+
+def get_filename(manu_id, name: str) -> str:
+    return f'{manu_id}/{name}'
+
+
+def save(manu_id, name: str, source,
+         content_type: str = DEFAULT_TYPE):
+    """
+    Store a body, replacing any earlier one with the same name.
+    source can be bytes, a str, or a file-like object,
+    which is read a chunk at a time rather than all at once.
+    Returns the new file's ID.
+    """
+    if isinstance(source, str):
+        source = source.encode(ENCODING)
+    bucket = get_bucket()
+    filename = get_filename(manu_id, name)
+    file_id = bucket.upload_from_stream(
+        filename, source,
+        metadata={MANU_ID: str(manu_id), NAME: name,
+                  CONTENT_TYPE: content_type})
+    # only once the new one is safely in, drop the old ones
+    for old in bucket.find({'filename': filename, '_id': {'$ne': file_id}}):
+        bucket.delete(old._id)
+    return file_id
+
+
+def save_text(manu_id, text: str):
+    return save(manu_id, TEXT_NAME, text, TEXT_TYPE)
+
+
+def open_body(manu_id, name: str):
+    """
+    Returns a file-like GridOut to read (and seek) the body,
+    or None if there is no such body.
+    """
+    try:
+        return get_bucket().open_download_stream_by_name(
+            get_filename(manu_id, name))
+    except gridfs.errors.NoFile:
+        return None
+
+
+def read_text(manu_id) -> str:
+    """
+    The whole text of a manuscript, or None if it has none.
+    """
+    body = open_body(manu_id, TEXT_NAME)
+    if body is None:
+        return None
+    with body:
+        return body.read().decode(ENCODING)
+
+
+def list_bodies(manu_id) -> list:
+    return [{
+        NAME: grid_out.metadata.get(NAME),
+        CONTENT_TYPE: grid_out.metadata.get(CONTENT_TYPE),
+        LENGTH: grid_out.length,
+        UPLOADED: grid_out.upload_date.isoformat(),
+    } for grid_out in get_bucket().find({f'metadata.{MANU_ID}':
+                                         str(manu_id)})]
+
+
+def delete_all(manu_id) -> int:
+    bucket = get_bucket()
+    file_ids = [grid_out._id for grid_out in
+                bucket.find({f'metadata.{MANU_ID}': str(manu_id)})]
+    for file_id in file_ids:
+        bucket.delete(file_id)
+    return len(file_ids)
@@ -0,0 +1,97 @@
+"""
+A small in-process cache for results that change rarely.
+Entries expire after a TTL, and writers can invalidate them explicitly.
+Expired entries are pruned as new ones go in, and the cache never holds
+more than max_size entries, so per-key caches can't grow without bound.
+"""
+import threading
+import time
+
+DEFAULT_TTL = 60  # seconds
+DEFAULT_MAX_SIZE = 10_000
+
+HITS = 'hits'
+MISSES = 'misses'
+INVALIDATIONS = 'invalidations'
+SIZE = 'size'
+
+
+class TTLCache:
+    def __init__(self, ttl: float = DEFAULT_TTL,
+                 max_size: int = DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # in insertion order, which is expiry order: every entry
+        # gets the same TTL
+        self.entries = {}
+        self.pruned = time.monotonic()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # bumped on every invalidation, so a value computed from data
+        # read before a write never lands in the cache after it
+        self.generation = 0
+
+    def get(self, key, compute):
+        """
+        Return the cached value for key, calling compute() to fill it
+        if it is missing or has expired.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.generation
+        value = compute()
+        with self.lock:
+            if generation == self.generation:
+                self.put(key, value, now)
+        return value
+
+    def put(self, key, value, now: float):
+        """
+        Call with the lock held.
+        """
+        # re-insert, so the entry moves to the end of the expiry order
+        self.entries.pop(key, None)
+        if now - self.pruned > self.ttl or len(self.entries) >= self.max_size:
+            self.prune(now)
+        while len(self.entries) >= self.max_size:
+            # full of live entries: evict the one expiring soonest
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = (now + self.ttl, value)
+
+    def prune(self, now: float):
+        """
+        Drop expired entries. Call with the lock held.
+        """
+        for key in list(self.entries):
+            if self.entries[key][0] > now:
+                break  # the rest expire later
+            del self.entries[key]
+        self.pruned = now
+
+    def invalidate(self, key=None):
+        """
+        Drop one key, or everything if no key is given.
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                HITS: self.hits,
+                MISSES: self.misses,
+                INVALIDATIONS: self.invalidations,
+                SIZE: len(self.entries),
+            }
@@ -1,6 +1,12 @@
+import base64
+import json
 import os
+import threading
 
 import pymongo as pm
+from pymongo import monitoring
+from bson import ObjectId
+from bson.errors import InvalidId
 
 LOCAL = "0"
 CLOUD = "1"
@@ -8,41 +14,182 @@ CLOUD = "1"
 SE_DB = 'generalDB'
 
 client = None
+client_pid = None
+client_lock = threading.Lock()
 
 MONGO_ID = '_id'
 
+STREAM_BATCH_SIZE = 500
+
+# Connection pool settings: env var -> (MongoClient option, type, default).
+# Size the pool for the number of threads per worker.
+# Compressors is a comma-separated list, e.g. "zstd,zlib".
+POOL_SETTINGS = {
+    'MONGO_MAX_POOL_SIZE': ('maxPoolSize', int, 20),
+    'MONGO_MIN_POOL_SIZE': ('minPoolSize', int, 0),
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int, 10000),
+    'MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int, 60000),
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS',
+                                          int, 30000),
+    'MONGO_COMPRESSORS': ('compressors', str, None),
+}
+
+
+def get_pool_options() -> dict:
+    """
+    Read the pool settings from the environment,
+    falling back on our defaults.
+    """
+    opts = {}
+    for env_var, (opt, opt_type, default) in POOL_SETTINGS.items():
+        val = os.environ.get(env_var)
+        if val is None:
+            val = default
+        elif opt_type is int:
+            try:
+                val = int(val)
+            except ValueError:
+                raise ValueError(f'{env_var} must be an integer: {val}')
+        if val is not None:
+            opts[opt] = val
+    return opts
+
+
+CREATED = 'connections_created'
+CLOSED = 'connections_closed'
+OPEN = 'connections_open'
+CHECKED_OUT = 'checked_out'
+MAX_CHECKED_OUT = 'max_checked_out'
+CHECKOUTS = 'checkouts'
+CHECKOUT_FAILURES = 'checkout_failures'
+MAX_POOL_SIZE = 'max_pool_size'
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events so we can see how busy the pool is.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {
+            CREATED: 0,
+            CLOSED: 0,
+            CHECKED_OUT: 0,
+            MAX_CHECKED_OUT: 0,
+            CHECKOUTS: 0,
+            CHECKOUT_FAILURES: 0,
+        }
+
+    def bump(self, name, by=1):
+        with self.lock:
+            self.counts[name] += by
+
+    def connection_created(self, event):
+        self.bump(CREATED)
+
+    def connection_closed(self, event):
+        self.bump(CLOSED)
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.counts[CHECKOUTS] += 1
+            self.counts[CHECKED_OUT] += 1
+            self.counts[MAX_CHECKED_OUT] = max(self.counts[MAX_CHECKED_OUT],
+                                               self.counts[CHECKED_OUT])
+
+    def connection_checked_in(self, event):
+        self.bump(CHECKED_OUT, -1)
+
+    def connection_check_out_failed(self, event):
+        self.bump(CHECKOUT_FAILURES)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counts)
+        stats[OPEN] = stats[CREATED] - stats[CLOSED]
+        return stats
+
+
+pool_metrics = PoolMetrics()
+
+
+def get_pool_stats() -> dict:
+    """
+    Pool utilization: checked_out against max_pool_size
+    tells us whether requests are queueing for a connection.
+    """
+    stats = pool_metrics.stats()
+    stats[MAX_POOL_SIZE] = get_pool_options().get('maxPoolSize')
+    return stats
+
 
 def connect_db():
     """
-    This provides a uniform way to connect to the DB across all uses.
-    Returns a mongo client object... maybe we shouldn't?
-    Also set global client variable.
-    We should probably either return a client OR set a
-    client global.
-    """
-    global client
-    if client is None:  # not connected yet!
-        print("Setting client because it is None.")
-        if os.environ.get("CLOUD_MONGO", LOCAL) == CLOUD:
-            password = os.environ.get("MONGO_PW")
-            if not password:
-                raise ValueError('You must set MONGO_PW to your password '
-                                 + 'to use Mongo in the cloud.')
-            client = pm.MongoClient(f'mongodb+srv://Melanie:{password}'
-                                    + '@cluster0.gr8q0.mongodb.net/?'
-                                    + 'retryWrites=true'
-                                    + '&w=majority'
-                                    + '&appName=Cluster0',
-                                    connectTimeoutMS=30000,
-                                    socketTimeoutMS=None,
-                                    connect=False,
-                                    maxPoolsize=1)
-        else:
-            print("Connecting to Mongo locally.")
-            client = pm.MongoClient("mongodb://localhost:27017/")
+    This provides a uniform way to connect to the DB across all uses,
+    and is the only way to get at the client.
+    Nothing connects at import time: the client is built on first use,
+    and built again in a forked worker rather than inherited.
+    """
+    global client, client_pid
+    pid = os.getpid()
+    if client is not None and client_pid == pid:
+        return client
+    with client_lock:
+        if client is None or client_pid != pid:  # not connected yet!
+            client = make_client()
+            client_pid = pid
     return client
 
 
+def make_client():
+    pool_opts = get_pool_options()
+    if os.environ.get("CLOUD_MONGO", LOCAL) == CLOUD:
+        password = os.environ.get("MONGO_PW")
+        if not password:
+            raise ValueError('You must set MONGO_PW to your password '
+                             + 'to use Mongo in the cloud.')
+        return pm.MongoClient(f'mongodb+srv://Melanie:{password}'
+                              + '@cluster0.gr8q0.mongodb.net/?'
+                              + 'retryWrites=true'
+                              + '&w=majority'
+                              + '&appName=Cluster0',
+                              connectTimeoutMS=30000,
+                              socketTimeoutMS=None,
+                              connect=False,
+                              event_listeners=[pool_metrics],
+                              **pool_opts)
+    return pm.MongoClient("mongodb://localhost:27017/",
+                          connect=False,
+                          event_listeners=[pool_metrics],
+                          **pool_opts)
+
+
+def get_db(db=SE_DB):
+    return connect_db()[db]
+
+
+def get_collection(collection, db=SE_DB):
+    return get_db(db)[collection]
+
+
 def convert_mongo_id(doc: dict):
     if MONGO_ID in doc:
         # Convert mongo ID to a string so it works as JSON
@@ -54,66 +201,295 @@ def insert_one(collection, doc, db=SE_DB):
     Insert a single doc into collection.
     """
     print(f'{db=}')
-    res = client[db][collection].insert_one(doc)
+    res = get_collection(collection, db).insert_one(doc)
     convert_mongo_id(doc)
     return res
 
 
+def insert_many(collection, docs, db=SE_DB):
+    """
+    Insert a batch of docs in one round trip.
+    Unordered, so one bad doc does not stop the rest.
+    """
+    return get_collection(collection, db).insert_many(docs, ordered=False)
+
+
 def del_one(collection, filt, db=SE_DB):
     """
     Find with a filter and return on the first doc found.
     """
     print(f'{filt=}')
-    del_result = client[db][collection].delete_one(filt)
+    del_result = get_collection(collection, db).delete_one(filt)
     return del_result.deleted_count
 
 
+def del_many(collection, filt, db=SE_DB):
+    """
+    Delete every doc matching filt. Returns how many went.
+    """
+    return get_collection(collection, db).delete_many(filt).deleted_count
+
+
+def find_one_and_delete(collection, filt, db=SE_DB, fields=None):
+    """
+    Atomically delete the first doc matching filt and return it,
+    limited to fields if given.
+    Return None if nothing matched.
+    """
+    doc = get_collection(collection, db).find_one_and_delete(
+        filt, projection=make_projection(fields))
+    if doc is not None:
+        convert_mongo_id(doc)
+    return doc
+
+
 def update(collection, filters, update_dict, db=SE_DB):
-    return client[db][collection].update_one(filters, {'$set': update_dict})
+    return get_collection(collection, db).update_one(filters,
+                                                     {'$set': update_dict})
 
 
-def read_one(collection, filt, db=SE_DB):
+def update_ops(collection, filters, update_doc, db=SE_DB):
     """
-    Find with a filter and return on the first doc found.
+    Apply a full update document (operators like $addToSet or $pull,
+    or an aggregation pipeline) to the first doc matching filters.
+    """
+    return get_collection(collection, db).update_one(filters, update_doc)
+
+
+def find_one_and_update(collection, filt, update_doc, db=SE_DB,
+                        fields=None, return_new=True):
+    """
+    Atomically update the first doc matching filt and return it
+    (as it is after the update, unless return_new is False),
+    limited to fields if given.
+    Return None if nothing matched.
+    """
+    if return_new:
+        return_doc = pm.ReturnDocument.AFTER
+    else:
+        return_doc = pm.ReturnDocument.BEFORE
+    doc = get_collection(collection, db).find_one_and_update(
+        filt, update_doc, projection=make_projection(fields),
+        return_document=return_doc)
+    if doc is not None:
+        convert_mongo_id(doc)
+    return doc
+
+
+def make_projection(fields=None):
+    """
+    Turn a list of field names into a Mongo projection.
+    None means "the whole document";
+    a dict is taken to be a projection already.
+    """
+    if fields is None or isinstance(fields, dict):
+        return fields
+    return {field: 1 for field in fields}
+
+
+def include_field(fields, field: str):
+    """
+    fields (a list or a projection) as a projection that also returns
+    field, e.g. the key we sort or index the results on.
+    """
+    projection = make_projection(fields)
+    if not projection:
+        return projection  # everything comes back anyway
+    others = [val for name, val in projection.items() if name != MONGO_ID]
+    if any(others) if others else projection[MONGO_ID]:
+        return {**projection, field: 1}
+    # an exclusion projection: just don't exclude field
+    return {name: val for name, val in projection.items() if name != field}
+
+
+def read_one(collection, filt, db=SE_DB, fields=None):
+    """
+    Find with a filter and return the first doc found,
+    limited to fields if given.
     Return None if not found.
     """
-    for doc in client[db][collection].find(filt):
+    doc = get_collection(collection, db).find_one(filt,
+                                                  make_projection(fields))
+    if doc is not None:
         convert_mongo_id(doc)
-        return doc
+    return doc
 
 
-def read(collection, db=SE_DB, no_id=True) -> list:
+def read(collection, db=SE_DB, no_id=True, fields=None) -> list:
     """
-    Returns a list from the db.
+    Returns a list from the db, limited to fields if given.
     """
+    projection = make_projection(fields)
+    if no_id:
+        # let the server drop the id rather than shipping it to delete it
+        projection = {**(projection or {}), MONGO_ID: 0}
     ret = []
-    for doc in client[db][collection].find():
-        if no_id:
-            del doc[MONGO_ID]
-        else:
-            convert_mongo_id(doc)
+    for doc in get_collection(collection, db).find({}, projection):
+        convert_mongo_id(doc)
         ret.append(doc)
     return ret
 
 
-def read_dict(collection, key, db=SE_DB, no_id=True) -> dict:
-    recs = read(collection, db=db, no_id=no_id)
+def read_dict(collection, key, db=SE_DB, no_id=True, fields=None) -> dict:
+    fields = include_field(fields, key)
+    recs = read(collection, db=db, no_id=no_id, fields=fields)
     recs_as_dict = {}
     for rec in recs:
         recs_as_dict[rec[key]] = rec
     return recs_as_dict
 
 
-def fetch_all(collection, db=SE_DB):
+def find(collection, filt, db=SE_DB, no_id=True, fields=None,
+         sort=None, limit=0) -> list:
+    """
+    Returns the docs matching filt as a list,
+    optionally sorted, limited, and cut down to fields.
+    """
+    projection = make_projection(fields)
+    if no_id:
+        projection = {**(projection or {}), MONGO_ID: 0}
+    cursor = get_collection(collection, db).find(filt, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    ret = []
+    for doc in cursor.limit(limit):
+        convert_mongo_id(doc)
+        ret.append(doc)
+    return ret
+
+
+def count(collection, filt, db=SE_DB) -> int:
+    """
+    Count the docs matching filt on the server.
+    """
+    return get_collection(collection, db).count_documents(filt)
+
+
+def distinct(collection, key, filt=None, db=SE_DB) -> list:
+    """
+    The distinct values of key among the docs matching filt.
+    """
+    return get_collection(collection, db).distinct(key, filt)
+
+
+def aggregate(collection, pipeline, db=SE_DB) -> list:
+    """
+    Run an aggregation pipeline server-side and return the results.
+    """
+    ret = []
+    for doc in get_collection(collection, db).aggregate(pipeline):
+        convert_mongo_id(doc)
+        ret.append(doc)
+    return ret
+
+
+def create_index(collection, keys, db=SE_DB, **kwargs):
+    """
+    Create an index on collection if it isn't already there.
+    Mongo treats this as a no-op when the index exists.
+    """
+    return get_collection(collection, db).create_index(keys, **kwargs)
+
+
+def stream(collection, db=SE_DB, no_id=True, fields=None,
+           batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield docs one at a time straight off the cursor,
+    which fetches batch_size docs per round trip.
+    Memory use does not grow with the size of the collection.
+    """
+    projection = make_projection(fields)
+    if no_id:
+        projection = {**(projection or {}), MONGO_ID: 0}
+    cursor = get_collection(collection, db).find({}, projection,
+                                                 batch_size=batch_size)
+    try:
+        for doc in cursor:
+            convert_mongo_id(doc)
+            yield doc
+    finally:
+        cursor.close()
+
+
+def index_information(collection, db=SE_DB) -> dict:
+    return get_collection(collection, db).index_information()
+
+
+def explain(collection, filt, db=SE_DB) -> dict:
+    """
+    Return the query planner's explanation of a find with filt.
+    """
+    return get_collection(collection, db).find(filt).explain()
+
+
+def encode_page_token(key_val, _id) -> str:
+    """
+    A page token is the (sort key, id) of the last doc on a page,
+    plus whether the id is an ObjectId: a string id such as an email
+    can look like one, so we can't tell from the id alone.
+    """
+    is_oid = isinstance(_id, ObjectId)
+    raw = json.dumps([key_val, str(_id) if is_oid else _id, is_oid]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_page_token(token: str):
+    try:
+        key_val, _id, is_oid = json.loads(
+            base64.urlsafe_b64decode(token.encode()))
+        if is_oid:
+            _id = ObjectId(_id)
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError(f'Bad page token: {token}')
+    return key_val, _id
+
+
+def read_page(collection, key, limit: int, after: str = None,
+              db=SE_DB, no_id=True, fields=None):
+    """
+    Keyset pagination: returns up to limit docs sorted on (key, _id),
+    starting after the doc named by the page token,
+    plus the token for the next page (None on the last page).
+    key should be indexed so every page is an index range scan.
+    """
+    filt = {}
+    if after:
+        key_val, _id = decode_page_token(after)
+        filt = {'$or': [{key: {'$gt': key_val}},
+                        {key: key_val, MONGO_ID: {'$gt': _id}}]}
+    # the page token needs the sort key and the id
+    fields = include_field(include_field(fields, key), MONGO_ID)
+    cursor = (get_collection(collection, db)
+              .find(filt, make_projection(fields))
+              .sort([(key, pm.ASCENDING), (MONGO_ID, pm.ASCENDING)])
+              .limit(limit + 1))
+    docs = list(cursor)
+    next_token = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_token = encode_page_token(last[key], last[MONGO_ID])
+    for doc in docs:
+        if no_id:
+            del doc[MONGO_ID]
+        else:
+            convert_mongo_id(doc)
+    return docs, next_token
+
+
+def fetch_all(collection, db=SE_DB, fields=None):
     ret = []
-    for doc in client[db][collection].find():
+    projection = make_projection(fields)
+    for doc in get_collection(collection, db).find({}, projection):
         ret.append(doc)
     return ret
 
 
-def fetch_all_as_dict(key, collection, db=SE_DB):
+def fetch_all_as_dict(key, collection, db=SE_DB, fields=None):
+    if fields is not None and key not in fields:
+        fields = [key, *fields]
+    projection = {**(make_projection(fields) or {}), MONGO_ID: 0}
     ret = {}
-    for doc in client[db][collection].find():
-        del doc[MONGO_ID]
+    for doc in get_collection(collection, db).find({}, projection):
         ret[doc[key]] = doc
     return ret
@@ -0,0 +1,219 @@
+"""
+This module declares the indexes each collection needs,
+applies them, and checks that our lookups actually use them.
+Apply with:
+    python -m data.indexes
+Check with:
+    python -m data.indexes check
+"""
+import sys
+from datetime import datetime, timezone
+
+import pymongo as pm
+
+import data.bodies as bds
+import data.db_connect as dbc
+import data.manuscripts as manu
+import data.people as ppl
+import data.revisions as revs
+import data.roles as rls
+import data.transitions as trans
+import data.users as usr
+import security.tokens as tkn
+
+# index spec fields
+NAME = 'name'
+KEYS = 'keys'
+UNIQUE = 'unique'
+# any other create_index() options
+OPTIONS = 'options'
+# a typical filter for the lookup this index serves: used by check()
+SAMPLE = 'sample'
+
+ASC = pm.ASCENDING
+DESC = pm.DESCENDING
+TEXT = pm.TEXT
+
+INDEXES = {
+    ppl.PEOPLE_COLLECT: [
+        {
+            NAME: 'email_unique',
+            KEYS: [(ppl.EMAIL, ASC)],
+            UNIQUE: True,
+            SAMPLE: {ppl.EMAIL: ppl.TEST_EMAIL},
+        },
+        {
+            NAME: 'roles',
+            KEYS: [(ppl.ROLES, ASC)],
+            SAMPLE: {ppl.ROLES: {'$in': rls.MH_ROLES}},
+        },
+    ],
+    manu.MANU_COLLECT: [
+        {
+            NAME: 'title_unique',
+            KEYS: [(manu.TITLE, ASC)],
+            UNIQUE: True,
+            SAMPLE: {manu.TITLE: manu.SAMPLE_MANU[manu.TITLE]},
+        },
+        {
+            NAME: 'text_search',
+            KEYS: [(manu.TITLE, TEXT), (manu.AUTHOR, TEXT),
+                   (manu.ABSTRACT, TEXT)],
+            OPTIONS: {
+                'weights': {manu.TITLE: 10, manu.AUTHOR: 5,
+                            manu.ABSTRACT: 1},
+            },
+            SAMPLE: manu.text_search_filter('python'),
+        },
+        {
+            NAME: 'curr_state',
+            KEYS: [(manu.CURR_STATE, ASC)],
+            SAMPLE: {manu.CURR_STATE: manu.SUBMITTED},
+        },
+        {
+            # also serves lookups on referees alone
+            NAME: 'referees_curr_state',
+            KEYS: [(manu.REFEREES, ASC), (manu.CURR_STATE, ASC)],
+            SAMPLE: {manu.REFEREES: ppl.TEST_EMAIL,
+                     manu.CURR_STATE: manu.IN_REF_REV},
+        },
+        {
+            NAME: 'author_email_curr_state',
+            KEYS: [(manu.AUTHOR_EMAIL, ASC), (manu.CURR_STATE, ASC)],
+            SAMPLE: {manu.AUTHOR_EMAIL: ppl.TEST_EMAIL,
+                     manu.CURR_STATE: manu.SUBMITTED},
+        },
+    ],
+    revs.REV_COLLECT: [
+        {
+            NAME: 'manu_id_rev_unique',
+            KEYS: [(revs.MANU_ID, ASC), (revs.REV, ASC)],
+            UNIQUE: True,
+            SAMPLE: {revs.MANU_ID: manu.TEST_ID, revs.REV: 0},
+        },
+    ],
+    trans.TRANS_COLLECT: [
+        {
+            NAME: 'manu_id_timestamp',
+            KEYS: [(trans.MANU_ID, ASC), (trans.TIMESTAMP, DESC)],
+            SAMPLE: {trans.MANU_ID: manu.TEST_ID},
+        },
+        {
+            NAME: 'to_state_timestamp',
+            KEYS: [(trans.TO_STATE, ASC), (trans.TIMESTAMP, DESC)],
+            SAMPLE: {trans.TO_STATE: manu.SUBMITTED},
+        },
+    ],
+    # GridFS indexes filename itself; we also look files up by manuscript
+    f'{bds.BODY_BUCKET}.files': [
+        {
+            NAME: 'metadata_manu_id',
+            KEYS: [(f'metadata.{bds.MANU_ID}', ASC)],
+            SAMPLE: {f'metadata.{bds.MANU_ID}': manu.TEST_ID},
+        },
+    ],
+    tkn.REVOKED_COLLECT: [
+        {
+            # Mongo drops each revocation once its token has expired
+            NAME: 'exp_ttl',
+            KEYS: [(tkn.EXPIRES, ASC)],
+            OPTIONS: {'expireAfterSeconds': 0},
+            SAMPLE: {tkn.EXPIRES: {'$gt': datetime.now(timezone.utc)}},
+        },
+    ],
+    usr.USERS_COLLECT: [
+        {
+            NAME: 'email_unique',
+            KEYS: [(usr.EMAIL, ASC)],
+            UNIQUE: True,
+            SAMPLE: {usr.EMAIL: ppl.TEST_EMAIL},
+        },
+    ],
+}
+
+COLLSCAN = 'COLLSCAN'
+MISSING = 'missing'
+COLLSCANS = 'collscans'
+ERRORS = 'errors'
+
+
+def ensure_indexes() -> dict:
+    """
+    Create every declared index. Mongo skips the ones already there,
+    so this is safe to run at every deploy.
+    Returns any errors (e.g. duplicate keys blocking a unique index)
+    keyed on collection.index name.
+    If we can't reach the DB at all, that is the one error we return:
+    no point waiting out the timeout once per index.
+    """
+    errors = {}
+    for collection, specs in INDEXES.items():
+        for spec in specs:
+            name = f'{collection}.{spec[NAME]}'
+            try:
+                dbc.create_index(collection, spec[KEYS], name=spec[NAME],
+                                 unique=spec.get(UNIQUE, False),
+                                 **spec.get(OPTIONS, {}))
+            except pm.errors.OperationFailure as err:
+                errors[name] = str(err)
+            except pm.errors.PyMongoError as err:
+                errors[name] = str(err)
+                return errors
+    return errors
+
+
+def has_stage(plan: dict, stage: str) -> bool:
+    """
+    Walk a query plan looking for stage.
+    """
+    if plan.get('stage') == stage:
+        return True
+    children = plan.get('inputStages', [])
+    if 'inputStage' in plan:
+        children = children + [plan['inputStage']]
+    return any(has_stage(child, stage) for child in children)
+
+
+def check() -> dict:
+    """
+    Report declared indexes that are missing,
+    and sample lookups that the planner answers with a collection scan.
+    """
+    report = {MISSING: [], COLLSCANS: []}
+    for collection, specs in INDEXES.items():
+        present = dbc.index_information(collection)
+        present_keys = [info['key'] for info in present.values()]
+        for spec in specs:
+            # text indexes list their keys differently: go by name
+            name = f'{collection}.{spec[NAME]}'
+            if (spec[NAME] not in present
+                    and spec[KEYS] not in present_keys):
+                # nothing to explain: a $text sample would even fail
+                report[MISSING].append(name)
+                continue
+            try:
+                plan = dbc.explain(collection, spec[SAMPLE])
+            except pm.errors.OperationFailure:
+                # e.g. $text with the text index gone since we looked
+                report[MISSING].append(name)
+                continue
+            if has_stage(plan['queryPlanner']['winningPlan'], COLLSCAN):
+                report[COLLSCANS].append(name)
+    return report
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        report = check()
+        print(f'{report=}')
+        if report[MISSING] or report[COLLSCANS]:
+            sys.exit(1)
+    else:
+        errors = ensure_indexes()
+        print(f'{errors=}')
+        if errors:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,13 @@
+import data.bodies as bds
+import data.cache as cache
 import data.db_connect as dbc
 import data.people as ppl
+import data.prefix_index as pidx
+import data.recommend as rec
+import data.revisions as revs
+import data.roles as rls
+import data.transitions as trans
+import time
 from copy import deepcopy
 from bson import ObjectId
 
@@ -10,11 +18,14 @@ CURR_STATE = 'curr_state'
 DISP_NAME = 'disp_name'
 MANU_ID = '_id'
 REFEREE = 'referee'
+ACTOR = 'actor'
 REFEREES = 'referees'
 TITLE = 'title'
 TEXT = 'text'
 ABSTRACT = 'abstract'
 EDITOR = 'editor'
+# bumped on every write, for optimistic concurrency:
+VERSION = 'version'
 
 
 TEST_ID = 'fake_id'
@@ -23,10 +34,6 @@ TEST_FLD_DISP_NM = 'Title'
 
 MANU_COLLECT = 'manuscript'
 
-# Make the connection
-client = dbc.connect_db()
-print(f"{client=}")
-
 FIELDS = {
     TITLE: {
         DISP_NAME: TEST_FLD_DISP_NM,
@@ -151,55 +158,103 @@ def is_valid_action(action: str) -> bool:
 #         return SUBMITTED
 
 
-def assign_ref(manu_id, referee) -> str:
+class ConflictError(ValueError):
     """
-    Add a referee to the list of referees a manuscript object has.
-    title -> str representing the manuscript title.
-    referee -> str representing the name or email of the referee.
-    Returns the updated manuscript object.
+    The manuscript changed under us (another version or state):
+    re-read it and retry.
     """
-    manu_obj = dbc.read_one(MANU_COLLECT, {'_id': manu_id})
-    if not manu_obj:
-        raise ValueError(f"No manuscript found with ID: {manu_id}")
 
-    ref_list = manu_obj.get(REFEREES, [])
-    if not isinstance(ref_list, list):
-        ref_list = []
 
-    if referee not in ref_list:
-        ref_list.append(referee)
-        dbc.update(MANU_COLLECT, {'_id': manu_id}, {REFEREES: ref_list})
-    else:
-        raise ValueError(f"Referee ({referee}) not found")
-    new_state = IN_REF_REV
-    dbc.update(MANU_COLLECT, {'_id': manu_id}, {CURR_STATE: new_state})
-    return new_state
+def with_version_bump(update):
+    """
+    Add a version bump to an update document or update pipeline.
+    Manuscripts written before we had versions count as version 0.
+    """
+    if isinstance(update, list):
+        return update + [{'$set': {VERSION: {
+            '$add': [{'$ifNull': [f'${VERSION}', 0]}, 1]}}}]
+    return {**update, '$inc': {VERSION: 1}}
 
 
-def delete_ref(manu_id, referee: str) -> str:
+def version_filter(version: int) -> dict:
+    if version == 0:
+        return {VERSION: {'$in': [0, None]}}
+    return {VERSION: version}
+
+
+def to_manu_id(manu_id):
+    if isinstance(manu_id, str) and ObjectId.is_valid(manu_id):
+        manu_id = ObjectId(manu_id)
+    return manu_id
+
+
+def assign_ref_update(referee: str) -> tuple:
     """
-    Removes a referee from the manuscript's referee list.
-    Returns the updated state after the operation.
+    Returns (filter, update) to add a referee and go to IN_REF_REV.
+    The filter refuses a referee who is already assigned,
+    so the update can just append. It is a pipeline so that older
+    manuscripts with a null or missing referees list get an empty one.
     """
-    manu_obj = dbc.read_one(MANU_COLLECT, {'_id': manu_id})
+    referees = {'$ifNull': [f'${REFEREES}', []]}
+    return ({REFEREES: {'$ne': referee}},
+            [{'$set': {REFEREES: {'$concatArrays': [referees, [referee]]},
+                       CURR_STATE: IN_REF_REV}}])
 
+
+def delete_ref_update(referee: str) -> tuple:
+    """
+    Returns (filter, update) to remove a referee.
+    The new state depends on whether any referees remain,
+    so the update is a pipeline that computes it server-side.
+    """
+    remaining = {'$filter': {'input': f'${REFEREES}',
+                             'cond': {'$ne': ['$$this', referee]}}}
+    new_state = {'$cond': [{'$gt': [{'$size': f'${REFEREES}'}, 0]},
+                           IN_REF_REV, SUBMITTED]}
+    return ({REFEREES: referee},
+            [{'$set': {REFEREES: remaining}},
+             {'$set': {CURR_STATE: new_state}}])
+
+
+def apply_update(manu_id, filt: dict, update) -> dict:
+    """
+    Apply one atomic update to a manuscript and return its new state,
+    or None if the manuscript didn't match filt.
+    """
+    return dbc.find_one_and_update(MANU_COLLECT,
+                                   {MANU_ID: manu_id, **filt},
+                                   with_version_bump(update),
+                                   fields=[CURR_STATE, VERSION])
+
+
+def read_state(manu_id) -> str:
+    manu_obj = dbc.read_one(MANU_COLLECT, {MANU_ID: to_manu_id(manu_id)},
+                            fields=[CURR_STATE])
     if not manu_obj:
         raise ValueError(f"No manuscript found with ID: {manu_id}")
+    return manu_obj[CURR_STATE]
 
-    ref_list = manu_obj.get(REFEREES, [])
 
-    if referee in ref_list and len(ref_list) > 0:
-        ref_list.remove(referee)
-        dbc.update(MANU_COLLECT, {'_id': manu_id}, {REFEREES: ref_list})
-    else:
-        raise ValueError(f"Referee ({referee}) not found")
-    if len(ref_list) > 0:
-        new_state = IN_REF_REV
-    else:
-        new_state = SUBMITTED
+def assign_ref(manu_id, referee, actor: str = None) -> str:
+    """
+    Add a referee to the list of referees a manuscript object has.
+    manu_id -> the manuscript's ID.
+    referee -> str representing the name or email of the referee.
+    Returns the new state of the manuscript.
+    Goes through handle_action, so the transition is logged.
+    """
+    return handle_action(manu_id, read_state(manu_id), ASSIGN_REF,
+                         **{REFEREE: referee, ACTOR: actor})
 
-    dbc.update(MANU_COLLECT, {'_id': manu_id}, {CURR_STATE: new_state})
-    return new_state
+
+def delete_ref(manu_id, referee: str, actor: str = None) -> str:
+    """
+    Removes a referee from the manuscript's referee list.
+    Returns the updated state after the operation.
+    Goes through handle_action, so the transition is logged.
+    """
+    return handle_action(manu_id, read_state(manu_id), DELETE_REF,
+                         **{REFEREE: referee, ACTOR: actor})
 
 
 def delete(title: str) -> str:
@@ -213,12 +268,15 @@ def delete(title: str) -> str:
     Returns:
         str: A message indicating the result of the deletion.
     """
-    # retrieve the manuscript by title
-    manu_obj = read_one(title)
-    if manu_obj:
-        # delete the manuscript from the database
-        dbc.del_one(MANU_COLLECT, {TITLE: title})
-        # delete from the database using the title
+    # delete from the database using the title
+    deleted = dbc.find_one_and_delete(MANU_COLLECT, {TITLE: title},
+                                      fields=[MANU_ID])
+    if deleted:
+        unindex_title(title)
+        bds.delete_all(deleted[MANU_ID])
+        revs.delete_all(deleted[MANU_ID])
+        if recommender is not None:
+            recommender.remove_doc(deleted[MANU_ID])
         return f"Deleted manuscript with title: {title}"
     else:
         return f"No manuscript found with title: {title}"
@@ -231,21 +289,71 @@ def update_manuscript_state(title: str, new_state: str):
     new_state -> new state to change curr_state to
     returns -> a string of updated state or error message
     """
-    manu_obj = read_one(title)
-
-    if not manu_obj:
-        return f"No manuscript found with title: {title}"
     if not is_valid_state(new_state):
         return f"New state {new_state} is not a valid state"
     try:
         # Reflect Manuscript state changes in database
-        dbc.update(MANU_COLLECT, {TITLE: title}, {CURR_STATE: new_state})
-
+        # the doc as it was before, so we can log where it came from
+        old_obj = dbc.find_one_and_update(
+            MANU_COLLECT, {TITLE: title},
+            with_version_bump({'$set': {CURR_STATE: new_state}}),
+            fields=[CURR_STATE], return_new=False)
+        if old_obj is None:
+            return f"No manuscript found with title: {title}"
+        trans.record(to_manu_id(old_obj[MANU_ID]), old_obj.get(CURR_STATE),
+                     new_state)
         return f"Manuscript '{title}' updated to state '{new_state}'"
     except ValueError as e:
         return str(e)  # Return the specific error message
 
 
+def update_title(title: str, new_title: str) -> str:
+    """
+    Rename a manuscript.
+    """
+    old_obj = dbc.find_one_and_update(
+        MANU_COLLECT, {TITLE: title},
+        with_version_bump({'$set': {TITLE: new_title}}),
+        fields=[AUTHOR, ABSTRACT], return_new=False)
+    if old_obj is None:
+        raise ValueError(f"No manuscript found with title: {title}")
+    unindex_title(title)
+    index_title(new_title, old_obj.get(AUTHOR))
+    if recommender is not None:
+        recommender.update_doc(old_obj[MANU_ID], recommend_text(
+            new_title, old_obj.get(ABSTRACT)))
+    return new_title
+
+
+def update_text(title: str, text: str) -> int:
+    """
+    Replace a manuscript's text, keeping the old one in its history.
+    Returns the new revision number.
+    The revision is claimed first, so if another writer beats us to it
+    we raise ConflictError with the stored text and history untouched.
+    """
+    manu_obj = read_one(title, fields=[MANU_ID])
+    if manu_obj is None:
+        raise ValueError(f"No manuscript found with title: {title}")
+    manu_id = manu_obj[MANU_ID]
+    if revs.latest_rev(manu_id) is None:
+        # created before we kept history: its inline text is revision 0
+        old_text = read_text(title)
+        if old_text:
+            try:
+                revs.add(manu_id, old_text)
+            except revs.ConflictError:
+                pass  # a concurrent writer saved it for us
+    try:
+        rev = revs.add(manu_id, text)
+    except revs.ConflictError as err:
+        raise ConflictError(str(err))
+    bds.save_text(manu_id, text)
+    dbc.update_ops(MANU_COLLECT, {MANU_ID: to_manu_id(manu_id)},
+                   with_version_bump({}))
+    return rev
+
+
 FUNC = 'f'
 
 COMMON_ACTIONS = {
@@ -327,22 +435,263 @@ def get_valid_actions_by_state(state: str):
     return valid_actions
 
 
-def read() -> dict:
+# fields for list views: everything but the (large) bodies
+SUMMARY_FIELDS = [TITLE, AUTHOR, AUTHOR_EMAIL, CURR_STATE, REFEREES]
+
+
+def read(fields: list = None) -> dict:
     # Return all instances of Manuscript objects
-    manus = dbc.read_dict(MANU_COLLECT, TITLE)
+    manus = dbc.read_dict(MANU_COLLECT, TITLE, fields=fields)
     return manus
 
 
-def read_one(title: str):
+def stream(fields: list = None):
+    """
+    Yield every manuscript, one record at a time.
+    """
+    return dbc.stream(MANU_COLLECT, fields=fields)
+
+
+def read_page(limit: int, after: str = None, fields: list = None):
+    """
+    Returns one page of manuscripts keyed on title, sorted by title,
+    and the token for the next page (None on the last page).
+    """
+    manus, next_token = dbc.read_page(MANU_COLLECT, TITLE, limit,
+                                      after=after, fields=fields)
+    return {manu[TITLE]: manu for manu in manus}, next_token
+
+
+# dashboards poll this: a few seconds of staleness is fine
+STATE_COUNTS_TTL = 10  # seconds
+state_counts_cache = cache.TTLCache(STATE_COUNTS_TTL)
+
+
+def count_by_state(referee: str = None, author_email: str = None) -> dict:
+    """
+    Count manuscripts per state with one $group, bypassing the cache.
+    Matching on curr_state keeps this an index scan:
+    on (curr_state), or (referees, curr_state) / (author_email, curr_state)
+    when filtering.
+    """
+    filt = {CURR_STATE: {'$in': list(VALID_STATE_LABELS)}}
+    if referee:
+        filt[REFEREES] = referee
+    if author_email:
+        filt[AUTHOR_EMAIL] = author_email
+    pipeline = [
+        {'$match': filt},
+        {'$group': {'_id': f'${CURR_STATE}', 'count': {'$sum': 1}}},
+    ]
+    counts = {state: 0 for state in VALID_STATE_LABELS}
+    for group in dbc.aggregate(MANU_COLLECT, pipeline):
+        counts[group[MANU_ID]] = group['count']
+    return counts
+
+
+def get_state_counts(referee: str = None, author_email: str = None) -> dict:
+    """
+    Returns {state: number of manuscripts in it} for every state,
+    optionally only for one referee's or one author's manuscripts.
+    """
+    return state_counts_cache.get(
+        (referee, author_email),
+        lambda: count_by_state(referee, author_email))
+
+
+# a referee's workload only counts manuscripts still in progress
+INACTIVE_STATES = [REJECTED, WITHDRAWN, PUBLISHED]
+MANUSCRIPTS = 'manuscripts'
+COUNTS = 'counts'
+
+
+def get_referee_manuscripts(referee: str) -> dict:
+    """
+    A referee's active manuscripts and how many are in each state,
+    from one scan of the (referees, curr_state) index.
+    """
+    active = [state for state in VALID_STATE_LABELS
+              if state not in INACTIVE_STATES]
+    manuscripts = dbc.find(MANU_COLLECT,
+                           {REFEREES: referee, CURR_STATE: {'$in': active}},
+                           no_id=False, fields=SUMMARY_FIELDS,
+                           sort=[(TITLE, 1)])
+    counts = {state: 0 for state in active}
+    for manuscript in manuscripts:
+        counts[manuscript[CURR_STATE]] += 1
+    return {MANUSCRIPTS: manuscripts, COUNTS: counts}
+
+
+# Type-ahead over titles and author names is answered in memory.
+# Our own writes update the index as they happen;
+# rebuilding every TYPEAHEAD_MAX_AGE seconds picks up other workers'.
+TYPEAHEAD_MAX_AGE = 300  # seconds
+title_index = None
+title_index_built = 0
+
+
+def build_title_index():
+    global title_index, title_index_built
+    title_index = pidx.PrefixIndex.build(
+        (rec[TITLE], rec[TITLE], rec.get(AUTHOR))
+        for rec in stream(fields=[TITLE, AUTHOR]))
+    title_index_built = time.monotonic()
+
+
+def get_title_index() -> pidx.PrefixIndex:
+    if (title_index is None
+            or time.monotonic() - title_index_built > TYPEAHEAD_MAX_AGE):
+        build_title_index()
+    return title_index
+
+
+def index_title(title: str, author: str):
+    if title_index is not None:
+        title_index.add(title, title, author)
+
+
+def unindex_title(title: str):
+    if title_index is not None:
+        title_index.remove(title)
+
+
+def typeahead(prefix: str, limit: int = pidx.DEFAULT_LIMIT) -> list:
+    """
+    Titles of manuscripts whose title or author
+    has a word starting with prefix.
+    """
+    return get_title_index().search(prefix, limit)
+
+
+# Referee recommendations are scored in memory, kept current like the
+# type-ahead index: our own writes update it as they happen,
+# and rebuilding every RECOMMEND_MAX_AGE seconds picks up other workers'.
+RECOMMEND_MAX_AGE = 600  # seconds
+RECOMMEND_LIMIT = 5
+# referees with this many active manuscripts are not recommended
+MAX_REFEREE_LOAD = 3
+# rank this many times the limit, to have enough left after filtering
+CANDIDATE_FACTOR = 4
+LOAD = 'load'
+recommender = None
+recommender_built = 0
+
+
+def recommend_text(title: str, abstract: str) -> str:
+    return f'{title or ""} {abstract or ""}'
+
+
+def build_recommender():
+    global recommender, recommender_built
+    recommender = rec.Recommender.build(
+        (manu_obj[MANU_ID],
+         recommend_text(manu_obj.get(TITLE), manu_obj.get(ABSTRACT)),
+         manu_obj.get(REFEREES) or [])
+        for manu_obj in dbc.stream(MANU_COLLECT, no_id=False,
+                                   fields=[TITLE, ABSTRACT, REFEREES]))
+    recommender_built = time.monotonic()
+
+
+def get_recommender() -> rec.Recommender:
+    if (recommender is None
+            or time.monotonic() - recommender_built > RECOMMEND_MAX_AGE):
+        build_recommender()
+    return recommender
+
+
+def note_referee(manu_id, referee: str, assigned: bool):
+    if recommender is None:
+        return
+    if assigned:
+        recommender.add_referee(str(manu_id), referee)
+    else:
+        recommender.remove_referee(str(manu_id), referee)
+
+
+def count_active_by_referee(referees: list) -> dict:
+    """
+    Returns {referee: number of active manuscripts} in one $group.
+    """
+    active = [state for state in VALID_STATE_LABELS
+              if state not in INACTIVE_STATES]
+    pipeline = [
+        {'$match': {REFEREES: {'$in': referees},
+                    CURR_STATE: {'$in': active}}},
+        {'$unwind': f'${REFEREES}'},
+        {'$match': {REFEREES: {'$in': referees}}},
+        {'$group': {'_id': f'${REFEREES}', 'count': {'$sum': 1}}},
+    ]
+    counts = {referee: 0 for referee in referees}
+    for group in dbc.aggregate(MANU_COLLECT, pipeline):
+        counts[group[MANU_ID]] = group['count']
+    return counts
+
+
+def recommend_referees(title: str, limit: int = RECOMMEND_LIMIT,
+                       max_load: int = MAX_REFEREE_LOAD) -> list:
+    """
+    The referees whose past manuscripts are most like this one,
+    best first. Leaves out the author, referees already assigned,
+    anyone at the author's affiliation or no longer a referee,
+    and referees with max_load active manuscripts or more.
+    """
+    manu_obj = read_one(title, fields=[TITLE, ABSTRACT, AUTHOR_EMAIL,
+                                       REFEREES])
+    if manu_obj is None:
+        raise ValueError(f"No manuscript found with title: {title}")
+    author_email = manu_obj.get(AUTHOR_EMAIL)
+    exclude = set(manu_obj.get(REFEREES) or []) | {author_email}
+    candidates = get_recommender().recommend(
+        recommend_text(manu_obj.get(TITLE), manu_obj.get(ABSTRACT)),
+        limit * CANDIDATE_FACTOR, exclude)
+    if not candidates:
+        return []
+    emails = [referee for referee, score in candidates]
+    author = ppl.read_one(author_email, fields=[ppl.AFFILIATION]) or {}
+    people = {person[ppl.EMAIL]: person for person in ppl.read_many(
+        emails, role=rls.REF_CODE,
+        fields=[ppl.EMAIL, ppl.NAME, ppl.AFFILIATION])}
+    loads = count_active_by_referee(emails)
+    recs = []
+    for referee, score in candidates:
+        person = people.get(referee)
+        if (person is None or loads[referee] >= max_load
+                or (author.get(ppl.AFFILIATION)
+                    and person.get(ppl.AFFILIATION)
+                    == author.get(ppl.AFFILIATION))):
+            continue
+        recs.append({**person, SCORE: round(score, 4),
+                     LOAD: loads[referee]})
+        if len(recs) == limit:
+            break
+    return recs
+
+
+def read_one(title: str, fields: list = None):
     """
     Return a Manuscript record if title of present in DB,
     else None.
     """
-    return dbc.read_one(MANU_COLLECT, {TITLE: title})
+    return dbc.read_one(MANU_COLLECT, {TITLE: title}, fields=fields)
+
+
+def read_text(title: str) -> str:
+    """
+    The full text of a manuscript, or None if there is no such manuscript.
+    Manuscripts created before bodies moved to GridFS
+    still have their text inline: fall back to that.
+    """
+    manu_obj = read_one(title, fields=[MANU_ID, TEXT])
+    if manu_obj is None:
+        return None
+    text = bds.read_text(manu_obj[MANU_ID])
+    if text is None:
+        text = manu_obj.get(TEXT)
+    return text
 
 
 def exists(title: str) -> bool:
-    return read_one(title) is not None
+    return read_one(title, fields=[TITLE]) is not None
 
 
 def is_valid_manuscript(title):
@@ -351,18 +700,18 @@ def is_valid_manuscript(title):
     Otherwise, return None
     """
     # Ensure that this manuscript title is unique
-    return read_one(title) is None
+    return not exists(title)
 
 
 # Create a manuscript object
 def create(title: str, author_email: str,
            abstract: None, text: None, referees=[]):
-    if not ppl.exists(author_email):
+    # Author name look up
+    person = ppl.read_one(author_email, fields=[ppl.NAME])
+    if person is None:
         raise ValueError(f"{author_email} doesn't exist,"
                          + "create person in 'View all people'")
-    # Author name look up
-    person = ppl.read_one(author_email)
-    name = person.get("name")
+    name = person.get(ppl.NAME)
     if is_valid_manuscript(title):
         contents = {
             TITLE: title,
@@ -370,51 +719,90 @@ def create(title: str, author_email: str,
             AUTHOR_EMAIL: author_email,
             CURR_STATE: SUBMITTED,  # SUBMITTED by default
             ABSTRACT: abstract,
-            TEXT: text,
-            REFEREES: referees
+            REFEREES: referees,
+            VERSION: 0,
         }
+        # the text goes to GridFS, so reads of the metadata stay small
         dbc.insert_one(MANU_COLLECT, contents)
+        if text:
+            bds.save_text(contents[MANU_ID], text)
+            revs.add(contents[MANU_ID], text)
+        index_title(title, name)
+        if recommender is not None:
+            recommender.add_doc(contents[MANU_ID],
+                                recommend_text(title, abstract), referees)
         print("Manuscript created and added to DB:", contents)
         return contents
     print(f"Manuscript with title '{title}' failed to add to DB")
     return None
 
 
-def handle_action(manu_id, curr_state, action, **kwargs) -> str:
-    if isinstance(manu_id, str):
-        manu_id = ObjectId(manu_id)
-    manu_obj = dbc.read_one(MANU_COLLECT, {'_id': manu_id})
-    if not manu_obj:
-        raise ValueError(f"No manuscript found with ID: {manu_id}")
-    kwargs['manu'] = manu_obj
+def handle_action(manu_id, curr_state, action, version: int = None,
+                  **kwargs) -> str:
+    """
+    Apply action to a manuscript in one atomic find_one_and_update.
+    The filter includes curr_state (and version, if given),
+    so if another editor has changed the manuscript in the meantime,
+    nothing is written and we raise ConflictError.
+    """
+    manu_id = to_manu_id(manu_id)
     if curr_state not in STATE_TABLE:
         raise ValueError(f'Bad state: {curr_state}')
     if action not in STATE_TABLE[curr_state]:
         raise ValueError(f'{action} not available in {curr_state}')
 
     if action == ASSIGN_REF:
-        referee = kwargs.get(REFEREE)
-        next_state = assign_ref(manu_id, referee)
+        filt, update = assign_ref_update(kwargs.get(REFEREE))
     elif action == DELETE_REF:
-        referee = kwargs.get(REFEREE)
-        next_state = delete_ref(manu_id, referee)
+        filt, update = delete_ref_update(kwargs.get(REFEREE))
     else:
         next_state = STATE_TABLE[curr_state][action][FUNC](**kwargs)
+        filt, update = {}, {'$set': {CURR_STATE: next_state}}
 
-    dbc.update(MANU_COLLECT, {'_id': manu_id}, {CURR_STATE: next_state})
-    return next_state
+    filt = {CURR_STATE: curr_state, **filt}
+    if version is not None:
+        filt.update(version_filter(version))
+    manu_obj = apply_update(manu_id, filt, update)
+    if not manu_obj:
+        # only on failure: find out why, for a useful message
+        manu_obj = dbc.read_one(MANU_COLLECT, {MANU_ID: manu_id},
+                                fields=[CURR_STATE, VERSION])
+        if not manu_obj:
+            raise ValueError(f"No manuscript found with ID: {manu_id}")
+        if version is not None and manu_obj.get(VERSION, 0) != version:
+            raise ConflictError('Manuscript is at version'
+                                + f' {manu_obj.get(VERSION, 0)},'
+                                + f' not {version}')
+        if manu_obj[CURR_STATE] != curr_state:
+            raise ConflictError(f'Manuscript is in {manu_obj[CURR_STATE]},'
+                                + f' not {curr_state}')
+        raise ValueError(f"Can't {action} referee {kwargs.get(REFEREE)}")
+    trans.record(manu_id, curr_state, manu_obj[CURR_STATE], action,
+                 actor=kwargs.get(ACTOR))
+    if action in (ASSIGN_REF, DELETE_REF):
+        note_referee(manu_id, kwargs.get(REFEREE),
+                     assigned=action == ASSIGN_REF)
+    return manu_obj[CURR_STATE]
+
+
+SCORE = 'score'
+SEARCH_LIMIT = 20
+TEXT_SCORE = {'$meta': 'textScore'}
+
+
+def text_search_filter(query: str) -> dict:
+    """
+    Served by the text index on title, author and abstract.
+    """
+    return {'$text': {'$search': query}}
 
 
-def search_manuscripts(query: str):
+def regex_search_filter(query: str) -> dict:
     """
-    Searches for manuscripts where the title or author
-    contains the query string.
-    Args:
-        query (str): The search query.
-    Returns:
-        list: A list of matching manuscripts.
+    What we used to search with: an unanchored regex can't use an index,
+    so this scans the whole collection. Kept as the benchmark baseline.
     """
-    search_filter = {
+    return {
         "$or": [
             # Case-insensitive search in title
             {TITLE: {"$regex": query, "$options": "i"}},
@@ -422,7 +810,23 @@ def search_manuscripts(query: str):
             {AUTHOR: {"$regex": query, "$options": "i"}}
         ]
     }
-    return list(dbc.read_all(MANU_COLLECT, search_filter))
+
+
+def search_manuscripts(query: str, limit: int = SEARCH_LIMIT) -> list:
+    """
+    Searches for manuscripts whose title, author or abstract
+    contain the words in query, best matches first.
+    Args:
+        query (str): The search query.
+        limit (int): The most results to return.
+    Returns:
+        list: Summaries of the matching manuscripts, each with a score.
+    """
+    projection = {field: 1 for field in SUMMARY_FIELDS}
+    projection[SCORE] = TEXT_SCORE
+    return dbc.find(MANU_COLLECT, text_search_filter(query),
+                    fields=projection, sort=[(SCORE, TEXT_SCORE)],
+                    limit=limit)
 
 
 def main():
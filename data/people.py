@@ -2,13 +2,10 @@
 module will interface to the user's data
 """
 import re
+import data.cache as cache
 import data.db_connect as dbc
 import data.roles as rls
 
-# Make the connection
-client = dbc.connect_db()
-print(f"{client=}")
-
 PEOPLE_COLLECT = 'people'
 MIN_USER_NAME_LEN = 2
 # fields
@@ -87,7 +84,8 @@ def is_valid_person(name: str, affiliation: str, email: str,
 
 
 def exists(email: str) -> bool:
-    return read_one(email) is not None
+    return dbc.read_one(PEOPLE_COLLECT, {EMAIL: email},
+                        fields=[EMAIL]) is not None
 
 
 def create(name: str, affiliation: str, email: str, role: str):
@@ -101,40 +99,97 @@ def create(name: str, affiliation: str, email: str, role: str):
         people_dict[email] = {NAME: name, AFFILIATION: affiliation,
                               EMAIL: email, ROLES: roles}
         dbc.insert_one(PEOPLE_COLLECT, people_dict[email])
+        invalidate_caches()
         print("Value added:", people_dict[email])
         return email
     return None
 
 
-def read() -> dict:
+def read(fields: list = None) -> dict:
     """
     Our contract:
-        - No arguments.
+        - Optionally, a list of fields to fetch (default: all).
         - Returns a dictionary of users keyed on user email.
         - Each user email must be the key for another dictionary.
     """
-    people = dbc.read_dict(PEOPLE_COLLECT, EMAIL)
+    people = dbc.read_dict(PEOPLE_COLLECT, EMAIL, fields=fields)
     print(f"{people=}")
     return people
 
 
-def read_one(email: str) -> dict:
+def stream(fields: list = None):
+    """
+    Yield every person, one record at a time.
+    """
+    return dbc.stream(PEOPLE_COLLECT, fields=fields)
+
+
+def read_page(limit: int, after: str = None, fields: list = None):
+    """
+    Returns one page of people keyed on email, sorted by email,
+    and the token for the next page (None on the last page).
+    """
+    recs, next_token = dbc.read_page(PEOPLE_COLLECT, EMAIL, limit,
+                                     after=after, fields=fields)
+    return {rec[EMAIL]: rec for rec in recs}, next_token
+
+
+def read_one(email: str, fields: list = None) -> dict:
     """
     Return a person record if email present in DB,
     else None.
     """
-    return dbc.read_one(PEOPLE_COLLECT, {EMAIL: email})
+    return dbc.read_one(PEOPLE_COLLECT, {EMAIL: email}, fields=fields)
+
+
+def read_many(emails: list, role: str = None, fields: list = None) -> list:
+    """
+    Return the records of the people with these emails,
+    only those with role if one is given, in one query.
+    """
+    filt = {EMAIL: {'$in': list(emails)}}
+    if role:
+        filt[ROLES] = role
+    return dbc.find(PEOPLE_COLLECT, filt, fields=fields)
+
+
+def count_with_role(role: str) -> int:
+    return dbc.count(PEOPLE_COLLECT, {ROLES: role})
+
+
+def any_with_role(role: str) -> bool:
+    return dbc.read_one(PEOPLE_COLLECT, {ROLES: role},
+                        fields=[EMAIL]) is not None
+
+
+def emails_with_role(role: str) -> list:
+    return dbc.distinct(PEOPLE_COLLECT, EMAIL, {ROLES: role})
+
+
+def count_roles() -> dict:
+    """
+    Returns {role: number of people with it}
+    for every role in use, in one $group.
+    """
+    pipeline = [
+        {'$match': {ROLES: {'$exists': True}}},
+        {'$project': {ROLES: 1}},
+        {'$unwind': f'${ROLES}'},
+        {'$group': {'_id': f'${ROLES}', 'count': {'$sum': 1}}},
+    ]
+    return {group[dbc.MONGO_ID]: group['count']
+            for group in dbc.aggregate(PEOPLE_COLLECT, pipeline)}
 
 
 def read_roles(email: str) -> list:
     """
     Return a person's roles if email present in DB,
-    else None.
+    else an empty list.
     """
-    person = read_one(email)
-    if not exists(email):
+    person = read_one(email, fields=[ROLES])
+    if person is None:
         return []
-    roles = person[ROLES]
+    roles = person.get(ROLES, [])
     if not isinstance(roles, list):
         roles = [roles]
     return roles
@@ -144,38 +199,47 @@ def update_roles(email: str, roles: list):
     """
     updating the roles in a person's DB
     """
-    if not exists(email):
-        raise ValueError(f'Updating non-existent person: {email=}')
     ret = dbc.update(PEOPLE_COLLECT,
                      {EMAIL: email},
                      {ROLES: roles})
+    if ret.matched_count == 0:
+        raise ValueError(f'Updating non-existent person: {email=}')
+    invalidate_caches()
     print(f'{ret=}')
     return email
 
 
-def add_role(email: str, role: str):
+def role_change_error(email: str, conflict: str) -> Exception:
     """
-    Add a role to an existing person, prevent multiple masthead roles
+    Called only after a conditional role update matched nothing,
+    to tell a missing person apart from a rule conflict.
     """
     if not exists(email):
-        raise ValueError(f'Person with {email} not found')
-    if role not in rls.ROLES:
+        return KeyError(f'Person with {email} not found')
+    return ValueError(conflict)
+
+
+def add_role(email: str, role: str):
+    """
+    Add a role to an existing person, prevent multiple masthead roles.
+    The masthead rule is part of the update filter,
+    so the check and the write are one atomic operation.
+    """
+    if not rls.is_valid(role):
         raise KeyError(f"The role {role} doesn't exist")
-    person_roles = read_roles(email)
-    masthead_roles = set(rls.get_masthead_roles().keys())
-
-    # Check for masthead role conflicts
-    if role in masthead_roles:
-        for existing_role in person_roles:
-            if existing_role in masthead_roles:
-                raise ValueError(
-                    "Can't assign more than one editor role"
-                    )
-    if role not in person_roles:
-        person_roles.append(role)
-        update_roles(email, person_roles)
+    mh_codes = list(rls.get_masthead_roles().keys())
+    if role in mh_codes:
+        roles_filt = {'$nin': mh_codes}
+        conflict = f"Can't assign {role}: person already has an editor role"
     else:
-        raise ValueError(f"Person is already assigned role: {role}")
+        roles_filt = {'$ne': role}
+        conflict = f"Person is already assigned role: {role}"
+    ret = dbc.update_ops(PEOPLE_COLLECT,
+                         {EMAIL: email, ROLES: roles_filt},
+                         {'$addToSet': {ROLES: role}})
+    if ret.matched_count == 0:
+        raise role_change_error(email, conflict)
+    invalidate_caches()
     return email
 
 
@@ -183,16 +247,15 @@ def remove_role(email: str, role: str):
     """
     Removing a role from an existing person
     """
-    if not exists(email):
-        raise ValueError(f'Person with {email} not found')
-    if role not in rls.ROLES:
+    if not rls.is_valid(role):
         raise KeyError(f"The role {role} doesn't exist")
-    person_roles = read_roles(email)
-    if role in person_roles:
-        person_roles.remove(role)
-        update_roles(email, person_roles)
-    else:
-        raise ValueError(f"Person did not have role: {role} to delete")
+    ret = dbc.update_ops(PEOPLE_COLLECT,
+                         {EMAIL: email, ROLES: role},
+                         {'$pull': {ROLES: role}})
+    if ret.matched_count == 0:
+        raise role_change_error(
+            email, f"Person did not have role: {role} to delete")
+    invalidate_caches()
     return email
 
 
@@ -200,64 +263,116 @@ def remove_all_roles(email: str):
     """
     Clear a user of all their roles
     """
-    if not exists(email):
+    ret = dbc.update_ops(PEOPLE_COLLECT,
+                         {EMAIL: email},
+                         {'$set': {ROLES: []}})
+    if ret.matched_count == 0:
         raise ValueError(f'Person with {email} not found')
-    person_roles = read_roles(email)
-    for role in person_roles:
-        if role in person_roles:
-            person_roles.remove(role)
-            update_roles(email, person_roles)
-        else:
-            raise ValueError(f"Person did not have role: {role} to delete")
+    invalidate_caches()
     return email
 
 
 def swap_role(email: str, old_role: str, new_role: str):
     """
-    updating role by swapping an old role for a new one
+    updating role by swapping an old role for a new one,
+    in a single conditional update
     """
-    remove_role(email, old_role)
-    add_role(email, new_role)
+    for role in (old_role, new_role):
+        if not rls.is_valid(role):
+            raise KeyError(f"The role {role} doesn't exist")
+    if old_role == new_role:
+        # nothing to write: the swap succeeds if they have the role
+        if not dbc.read_one(PEOPLE_COLLECT, {EMAIL: email, ROLES: old_role},
+                            fields=[EMAIL]):
+            raise role_change_error(
+                email, f"Person did not have role: {old_role} to swap")
+        return email
+    excluded = [new_role]
+    mh_roles = rls.get_masthead_roles()
+    if new_role in mh_roles:
+        excluded += [code for code in mh_roles if code != old_role]
+    new_roles = {'$concatArrays': [
+        {'$filter': {'input': f'${ROLES}',
+                     'cond': {'$ne': ['$$this', old_role]}}},
+        [new_role],
+    ]}
+    ret = dbc.update_ops(PEOPLE_COLLECT,
+                         {EMAIL: email,
+                          ROLES: {'$all': [old_role], '$nin': excluded}},
+                         [{'$set': {ROLES: new_roles}}])
+    if ret.matched_count == 0:
+        raise role_change_error(
+            email, f"Can't swap {old_role} for {new_role} for {email}")
+    invalidate_caches()
     return email
 
 
 def delete(email: str):
     print(f'{EMAIL=}, {email=}')
-    return dbc.del_one(PEOPLE_COLLECT, {EMAIL: email})
+    ret = dbc.del_one(PEOPLE_COLLECT, {EMAIL: email})
+    invalidate_caches()
+    return ret
 
 
 def update(name: str, affiliation: str, email: str, roles: list):
-    if not exists(email):
-        raise ValueError(f'Updating non-existent person: {email=}')
     if is_valid_person(name, affiliation, email, roles=roles):
         ret = dbc.update(PEOPLE_COLLECT,
                          {EMAIL: email},
                          {NAME: name, AFFILIATION: affiliation,
                           EMAIL: email, ROLES: roles})
+        if ret.matched_count == 0:
+            raise ValueError(f'Updating non-existent person: {email=}')
+        invalidate_caches()
         print(f'{ret=}')
         return email
 
 
 def update_affiliation(email: str, affiliation: str):
-    if not exists(email):
-        raise ValueError(f'Updating non-existent person: {email=}')
     ret = dbc.update(PEOPLE_COLLECT,
                      {EMAIL: email},
                      {AFFILIATION: affiliation})
+    if ret.matched_count == 0:
+        raise ValueError(f'Updating non-existent person: {email=}')
+    invalidate_caches()
     print(f'{ret=}')
     return email
 
 
 def update_name(email: str, name: str):
-    if not exists(email):
-        raise ValueError(f'Updating non-existent person: {email=}')
     ret = dbc.update(PEOPLE_COLLECT,
                      {EMAIL: email},
                      {NAME: name})
+    if ret.matched_count == 0:
+        raise ValueError(f'Updating non-existent person: {email=}')
+    invalidate_caches()
     print(f'{ret=}')
     return email
 
 
+# Role checks (e.g. "is this a referee?") run on every assignment:
+# cache the answers, dropped on any people write like the masthead.
+ROLE_CHECK_TTL = 30  # seconds
+role_check_cache = cache.TTLCache(ROLE_CHECK_TTL)
+
+
+def lookup_role(email: str, role: str) -> bool:
+    """
+    One indexed lookup on email, bypassing the cache.
+    """
+    return dbc.read_one(PEOPLE_COLLECT, {EMAIL: email, ROLES: role},
+                        fields=[EMAIL]) is not None
+
+
+def is_in_role(email: str, role: str) -> bool:
+    return role_check_cache.get((email, role),
+                                lambda: lookup_role(email, role))
+
+
+def invalidate_caches():
+    invalidate_masthead()
+    role_check_cache.invalidate()
+
+
 def has_role(person: dict, role: str) -> bool:
     if role in person.get(ROLES):
         return True
@@ -278,15 +393,56 @@ def create_mh_rec(person: dict) -> dict:
     return mh_rec
 
 
-def get_masthead():
-    masthead = {}
+def get_masthead_pipeline(mh_codes: list, journal_code=None) -> list:
+    """
+    One aggregation that groups masthead people by role:
+    only people holding some masthead role are read,
+    and only the fields we display are projected.
+    """
+    mh_fields = get_mh_fields(journal_code)
+    projection = {field: 1 for field in mh_fields}
+    projection[ROLES] = 1
+    projection[dbc.MONGO_ID] = 0
+    person_rec = {field: {'$ifNull': [f'${field}', '']}
+                  for field in mh_fields}
+    return [
+        {'$match': {ROLES: {'$in': mh_codes}}},
+        {'$project': projection},
+        {'$unwind': f'${ROLES}'},
+        {'$match': {ROLES: {'$in': mh_codes}}},
+        {'$group': {'_id': f'${ROLES}', 'people': {'$push': person_rec}}},
+    ]
+
+
+def build_masthead(journal_code=None) -> dict:
+    """
+    Compute the masthead from the DB, bypassing the cache.
+    The first $match is served by the roles index (see data.indexes).
+    """
     mh_roles = rls.get_masthead_roles()
+    pipeline = get_masthead_pipeline(list(mh_roles.keys()), journal_code)
+    people_by_role = {group[dbc.MONGO_ID]: group['people']
+                      for group in dbc.aggregate(PEOPLE_COLLECT, pipeline)}
+    masthead = {}
     for mh_role, text in mh_roles.items():
-        people_w_role = []  # Map a person to a list of their roles
-        people = read()
-        for _id, person in people.items():
-            if has_role(person, mh_role):
-                rec = create_mh_rec(person)
-                people_w_role.append(rec)
-        masthead[text] = people_w_role
+        masthead[text] = people_by_role.get(mh_role, [])
     return masthead
+
+
+# The masthead changes rarely: cache it per journal and drop it on any
+# people write. The TTL catches writes made by other processes.
+MASTHEAD_TTL = 300  # seconds
+masthead_cache = cache.TTLCache(MASTHEAD_TTL)
+
+
+def get_masthead(journal_code=None) -> dict:
+    return masthead_cache.get(journal_code,
+                              lambda: build_masthead(journal_code))
+
+
+def invalidate_masthead():
+    masthead_cache.invalidate()
+
+
+def get_masthead_cache_stats() -> dict:
+    return masthead_cache.stats()
@@ -0,0 +1,106 @@
+"""
+An in-memory prefix index for type-ahead.
+Each entry (e.g. a manuscript title) is indexed under a few normalized
+terms; a lookup is a binary search into one sorted list of
+(term, entry) pairs, with no DB round trip.
+"""
+import bisect
+import threading
+import unicodedata
+
+# bound the memory each entry can take
+MAX_TERMS_PER_ENTRY = 16
+MAX_TERM_LEN = 64
+DEFAULT_LIMIT = 10
+
+
+def normalize(text: str) -> str:
+    """
+    Case-fold, strip accents and collapse whitespace,
+    so "Écoles  Normales" and "ecoles normales" index the same.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def make_terms(*texts) -> tuple:
+    """
+    The terms an entry is found under: each whole text,
+    so "python imp" finds "Python imports",
+    and each word, so "imp" finds it too.
+    """
+    terms = []
+    for text in texts:
+        text = normalize(text)
+        if not text:
+            continue
+        terms.append(text[:MAX_TERM_LEN])
+        terms.extend(word[:MAX_TERM_LEN] for word in text.split())
+    return tuple(dict.fromkeys(terms))[:MAX_TERMS_PER_ENTRY]
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.pairs = []  # sorted (term, entry)
+        self.terms = {}  # entry -> its terms, so we can remove it
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    @classmethod
+    def build(cls, entries):
+        """
+        Build an index from (entry, *texts) tuples with one sort,
+        rather than one insort per term.
+        """
+        index = cls()
+        for entry, *texts in entries:
+            index.terms[entry] = make_terms(*(texts or [entry]))
+        index.pairs = sorted((term, entry)
+                             for entry, terms in index.terms.items()
+                             for term in terms)
+        return index
+
+    def add(self, entry: str, *texts):
+        """
+        Index entry under texts (the entry itself, if none are given).
+        """
+        if not texts:
+            texts = (entry,)
+        terms = make_terms(*texts)
+        with self.lock:
+            self._remove(entry)
+            for term in terms:
+                bisect.insort(self.pairs, (term, entry))
+            self.terms[entry] = terms
+
+    def remove(self, entry: str):
+        with self.lock:
+            self._remove(entry)
+
+    def _remove(self, entry: str):
+        for term in self.terms.pop(entry, ()):
+            i = bisect.bisect_left(self.pairs, (term, entry))
+            if i < len(self.pairs) and self.pairs[i] == (term, entry):
+                del self.pairs[i]
+
+    def search(self, prefix: str, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        Returns up to limit entries with a term starting with prefix,
+        in term order.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = {}
+        with self.lock:
+            i = bisect.bisect_left(self.pairs, (prefix,))
+            while i < len(self.pairs) and len(found) < limit:
+                term, entry = self.pairs[i]
+                if not term.startswith(prefix):
+                    break
+                found[entry] = True
+                i += 1
+        return list(found)
@@ -0,0 +1,185 @@
+"""
+An in-memory TF-IDF model for recommending referees.
+Each referee's profile is the text of the manuscripts they have refereed,
+weighted by TF-IDF and kept as a unit-length sparse vector.
+An inverted index (term -> {referee: weight}) means ranking a new
+manuscript only touches the referees who share a term with it,
+and the cosine similarity is just the sum of the matching weights.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+MIN_TOKEN_LEN = 3
+STOP_WORDS = frozenset('''
+    about above after again all also and any are because been before being
+    between both but can could did does doing down during each few for from
+    further had has have having here how into its itself just more most
+    not now off once only other our out over own same should some such than
+    that the their them then there these they this those through too under
+    until very was were what when where which while who whom why will with
+    would you your paper study using used use based new results approach
+'''.split())
+
+# once the corpus has grown or shrunk by this fraction since the
+# weights were computed, recompute them all: IDF has drifted
+REWEIGH_FRACTION = 0.1
+DEFAULT_LIMIT = 10
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> list:
+    return [token for token in TOKEN_RE.findall((text or '').lower())
+            if len(token) >= MIN_TOKEN_LEN and token not in STOP_WORDS]
+
+
+class Recommender:
+    def __init__(self):
+        self.doc_terms = {}  # doc id -> Counter of its terms
+        self.doc_refs = {}  # doc id -> set of its referees
+        self.doc_freq = Counter()  # term -> number of docs it is in
+        self.ref_docs = defaultdict(set)  # referee -> doc ids
+        self.vectors = {}  # referee -> {term: weight}, unit length
+        self.postings = defaultdict(dict)  # term -> {referee: weight}
+        self.weighed_at = 0  # number of docs when we last reweighed
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    @classmethod
+    def build(cls, docs):
+        """
+        Build from (doc id, text, referees) tuples,
+        weighing every referee once at the end.
+        """
+        model = cls()
+        for doc_id, text, referees in docs:
+            model._add_doc(doc_id, text, referees)
+        model._reweigh_all()
+        return model
+
+    def idf(self, term: str) -> float:
+        # smoothed, so a term in every doc still counts a little
+        return math.log((1 + len(self.doc_terms))
+                        / (1 + self.doc_freq[term])) + 1
+
+    def weigh(self, counts: Counter) -> dict:
+        """
+        TF-IDF weights for term counts, scaled to unit length.
+        """
+        vector = {term: (1 + math.log(count)) * self.idf(term)
+                  for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        if not norm:
+            return {}
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def add_doc(self, doc_id, text: str, referees=()):
+        with self.lock:
+            self._add_doc(doc_id, text, referees)
+            self._reweigh(self.doc_refs[doc_id])
+
+    def remove_doc(self, doc_id):
+        with self.lock:
+            referees = self._remove_doc(doc_id)
+            self._reweigh(referees)
+
+    def update_doc(self, doc_id, text: str):
+        """
+        Re-index a doc whose text changed, keeping its referees.
+        """
+        with self.lock:
+            referees = self._remove_doc(doc_id)
+            self._add_doc(doc_id, text, referees)
+            self._reweigh(referees)
+
+    def add_referee(self, doc_id, referee: str):
+        with self.lock:
+            if doc_id not in self.doc_terms:
+                return
+            self.doc_refs[doc_id].add(referee)
+            self.ref_docs[referee].add(doc_id)
+            self._reweigh([referee])
+
+    def remove_referee(self, doc_id, referee: str):
+        with self.lock:
+            self.doc_refs.get(doc_id, set()).discard(referee)
+            self.ref_docs[referee].discard(doc_id)
+            self._reweigh([referee])
+
+    def _add_doc(self, doc_id, text: str, referees):
+        if doc_id in self.doc_terms:
+            self._remove_doc(doc_id)
+        terms = Counter(tokenize(text))
+        self.doc_terms[doc_id] = terms
+        self.doc_freq.update(terms.keys())
+        self.doc_refs[doc_id] = set(referees)
+        for referee in referees:
+            self.ref_docs[referee].add(doc_id)
+
+    def _remove_doc(self, doc_id) -> set:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return set()
+        self.doc_freq.subtract(terms.keys())
+        self.doc_freq += Counter()  # drop the zeros
+        referees = self.doc_refs.pop(doc_id)
+        for referee in referees:
+            self.ref_docs[referee].discard(doc_id)
+        return referees
+
+    def _reweigh(self, referees):
+        """
+        Recompute the given referees' vectors, or everyone's
+        if the corpus has changed size enough to move IDF.
+        """
+        drift = abs(len(self.doc_terms) - self.weighed_at)
+        if drift > REWEIGH_FRACTION * max(self.weighed_at, 1):
+            self._reweigh_all()
+            return
+        for referee in referees:
+            self._set_vector(referee)
+
+    def _reweigh_all(self):
+        self.vectors = {}
+        self.postings = defaultdict(dict)
+        for referee in list(self.ref_docs):
+            self._set_vector(referee)
+        self.weighed_at = len(self.doc_terms)
+
+    def _set_vector(self, referee: str):
+        for term in self.vectors.pop(referee, {}):
+            self.postings[term].pop(referee, None)
+            if not self.postings[term]:
+                del self.postings[term]
+        profile = Counter()
+        for doc_id in self.ref_docs.get(referee, ()):
+            profile.update(self.doc_terms[doc_id])
+        if not profile:
+            self.ref_docs.pop(referee, None)
+            return
+        vector = self.weigh(profile)
+        self.vectors[referee] = vector
+        for term, weight in vector.items():
+            self.postings[term][referee] = weight
+
+    def recommend(self, text: str, limit: int = DEFAULT_LIMIT,
+                  exclude=()) -> list:
+        """
+        Returns up to limit (referee, cosine similarity) pairs
+        for text, best first, leaving out the referees in exclude.
+        """
+        with self.lock:
+            query = self.weigh(Counter(tokenize(text)))
+            scores = defaultdict(float)
+            for term, weight in query.items():
+                for referee, ref_weight in self.postings.get(term,
+                                                             {}).items():
+                    scores[referee] += weight * ref_weight
+        for referee in exclude:
+            scores.pop(referee, None)
+        return heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
@@ -0,0 +1,175 @@
+"""
+This module keeps the revision history of manuscript text.
+Each revision is stored as a zlib-compressed, line-level delta
+against the one before it, with a full snapshot every SNAPSHOT_EVERY
+revisions, so history costs about one copy of the text plus the edits,
+and rebuilding any revision applies at most SNAPSHOT_EVERY - 1 deltas.
+"""
+import difflib
+import json
+import zlib
+from datetime import datetime, timezone
+
+import pymongo as pm
+
+import data.db_connect as dbc
+
+REV_COLLECT = 'manuscript_revisions'
+
+# fields
+MANU_ID = 'manu_id'
+REV = 'rev'
+SNAPSHOT = 'snapshot'
+DATA = 'data'
+LENGTH = 'length'
+TIMESTAMP = 'timestamp'
+
+SNAPSHOT_EVERY = 10
+
+# delta ops
+COPY = '='  # ['=', start, end]: lines start:end of the previous revision
+INSERT = '+'  # ['+', [lines]]: new lines
+
+ENCODING = 'utf-8'
+
+
+class ConflictError(ValueError):
+    """
+    Another writer saved the revision we were about to: re-read and retry.
+    """
+
+
+def split_lines(text: str) -> list:
+    # keep the line ends, so joining the lines gives back the exact text
+    return (text or '').splitlines(keepends=True)
+
+
+def make_delta(old_lines: list, new_lines: list) -> list:
+    """
+    The ops that turn old_lines into new_lines.
+    Deleted lines simply are not copied.
+    """
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines,
+                                      autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([COPY, i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append([INSERT, new_lines[j1:j2]])
+    return ops
+
+
+def apply_delta(old_lines: list, ops: list) -> list:
+    new_lines = []
+    for op in ops:
+        if op[0] == COPY:
+            new_lines.extend(old_lines[op[1]:op[2]])
+        elif op[0] == INSERT:
+            new_lines.extend(op[1])
+        else:
+            raise ValueError(f'Bad delta op: {op[0]}')
+    return new_lines
+
+
+def compress(obj) -> bytes:
+    return zlib.compress(json.dumps(obj).encode(ENCODING))
+
+
+def decompress(data: bytes):
+    return json.loads(zlib.decompress(data).decode(ENCODING))
+
+
+def latest_rev(manu_id) -> int:
+    """
+    The number of the latest revision, or None if there are none.
+    """
+    recs = dbc.find(REV_COLLECT, {MANU_ID: str(manu_id)}, fields=[REV],
+                    sort=[(REV, pm.DESCENDING)], limit=1)
+    return recs[0][REV] if recs else None
+
+
+def get_lines(manu_id, rev: int) -> list:
+    """
+    Rebuild a revision from the nearest snapshot at or before it.
+    """
+    manu_id = str(manu_id)
+    snapshots = dbc.find(REV_COLLECT, {MANU_ID: manu_id, SNAPSHOT: True,
+                                       REV: {'$lte': rev}},
+                         sort=[(REV, pm.DESCENDING)], limit=1)
+    if not snapshots:
+        raise KeyError(f'No revision {rev} of manuscript {manu_id}')
+    snapshot = snapshots[0]
+    lines = decompress(snapshot[DATA])
+    deltas = dbc.find(REV_COLLECT, {MANU_ID: manu_id,
+                                    REV: {'$gt': snapshot[REV],
+                                          '$lte': rev}},
+                      sort=[(REV, pm.ASCENDING)])
+    if len(deltas) != rev - snapshot[REV]:
+        raise KeyError(f'No revision {rev} of manuscript {manu_id}')
+    for delta in deltas:
+        lines = apply_delta(lines, decompress(delta[DATA]))
+    return lines
+
+
+def get_revision(manu_id, rev: int) -> str:
+    """
+    The text of one revision.
+    Raises KeyError if there is no such revision.
+    """
+    return ''.join(get_lines(manu_id, rev))
+
+
+def add(manu_id, text: str) -> int:
+    """
+    Save text as the next revision. Returns its number.
+    Raises ConflictError if another writer saved that revision first.
+    """
+    rev = latest_rev(manu_id)
+    if rev is None:
+        rev = 0
+        is_snapshot = True
+    else:
+        old_lines = get_lines(manu_id, rev)
+        rev += 1
+        is_snapshot = rev % SNAPSHOT_EVERY == 0
+    new_lines = split_lines(text)
+    if is_snapshot:
+        data = compress(new_lines)
+    else:
+        data = compress(make_delta(old_lines, new_lines))
+    try:
+        dbc.insert_one(REV_COLLECT, {
+            MANU_ID: str(manu_id),
+            REV: rev,
+            SNAPSHOT: is_snapshot,
+            DATA: data,
+            LENGTH: len(text or ''),
+            TIMESTAMP: datetime.now(timezone.utc),
+        })
+    except pm.errors.DuplicateKeyError:
+        raise ConflictError(f'Revision {rev} of manuscript {manu_id}'
+                            + ' was saved by someone else: try again')
+    return rev
+
+
+def list_revisions(manu_id) -> list:
+    recs = dbc.find(REV_COLLECT, {MANU_ID: str(manu_id)},
+                    fields=[REV, SNAPSHOT, LENGTH, TIMESTAMP],
+                    sort=[(REV, pm.ASCENDING)])
+    for rec in recs:
+        rec[TIMESTAMP] = rec[TIMESTAMP].isoformat()
+    return recs
+
+
+def diff(manu_id, from_rev: int, to_rev: int) -> str:
+    """
+    A unified diff from one revision to another.
+    """
+    return ''.join(difflib.unified_diff(
+        get_lines(manu_id, from_rev), get_lines(manu_id, to_rev),
+        fromfile=f'rev {from_rev}', tofile=f'rev {to_rev}'))
+
+
+def delete_all(manu_id) -> int:
+    return dbc.del_many(REV_COLLECT, {MANU_ID: str(manu_id)})
@@ -1,14 +1,18 @@
 """
 This module manages person roles for a journal.
+The roles live in one registry doc in the roles collection,
+so every worker sees the same ones. Each process reads it into an
+immutable snapshot, and re-reads it when the registry's version changes.
 """
-from copy import deepcopy
+import threading
+import time
+from typing import NamedTuple
+
+import pymongo as pm
+
+import data.db_connect as dbc
 import data.people as ppl
 import re
-import data.db_connect as dbc
-
-# Make the connection
-client = dbc.connect_db()
-print(f"{client=}")
 
 ROLE_COLLECT = 'roles'
 AUTHOR_CODE = 'AU'
@@ -22,7 +26,8 @@ REV_CODE = 'RV'
 ASME_CODE = 'AE'
 
 
-ROLES = {
+# what a new registry starts with
+DEFAULT_ROLES = {
     AUTHOR_CODE: 'Author',
     ED_CODE: 'Editor',
     REF_CODE: 'Referee',
@@ -55,8 +60,115 @@ def is_valid_role(role: str) -> bool:
     return re.fullmatch(pattern, role)
 
 
+# registry doc fields
+REGISTRY_ID = 'registry'
+CODES = 'codes'  # {code: role name}
+MH_CODES = 'mh_codes'
+VERSION = 'version'
+
+# how often a process checks the registry version
+REFRESH_SECS = 5
+
+
+class FrozenDict(dict):
+    """
+    A dict that can't be changed,
+    so a snapshot can be handed out without copying it.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Role snapshots are read-only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class Snapshot(NamedTuple):
+    version: int
+    roles: FrozenDict
+    mh_roles: FrozenDict
+    codes: frozenset
+    mh_codes: frozenset
+
+
+def make_snapshot(registry: dict) -> Snapshot:
+    roles = registry.get(CODES, {})
+    mh_codes = frozenset(code for code in registry.get(MH_CODES, [])
+                         if code in roles)
+    return Snapshot(
+        version=registry.get(VERSION, 0),
+        roles=FrozenDict(roles),
+        mh_roles=FrozenDict((code, role) for code, role in roles.items()
+                            if code in mh_codes),
+        codes=frozenset(roles),
+        mh_codes=mh_codes,
+    )
+
+
+def load_registry() -> dict:
+    """
+    Read the registry, creating it from DEFAULT_ROLES the first time.
+    """
+    registry = dbc.read_one(ROLE_COLLECT, {dbc.MONGO_ID: REGISTRY_ID})
+    if registry is None:
+        try:
+            dbc.insert_one(ROLE_COLLECT, {
+                dbc.MONGO_ID: REGISTRY_ID,
+                CODES: DEFAULT_ROLES,
+                MH_CODES: MH_ROLES,
+                VERSION: 0,
+            })
+        except pm.errors.DuplicateKeyError:
+            pass  # another worker got there first
+        registry = dbc.read_one(ROLE_COLLECT, {dbc.MONGO_ID: REGISTRY_ID})
+    return registry
+
+
+snapshot = None
+snapshot_checked = 0
+snapshot_lock = threading.Lock()
+
+
+def get_snapshot() -> Snapshot:
+    """
+    The current snapshot. At most every REFRESH_SECS, one projected read
+    of the registry version tells us whether to reload it.
+    """
+    global snapshot, snapshot_checked
+    now = time.monotonic()
+    if snapshot is not None and now - snapshot_checked < REFRESH_SECS:
+        return snapshot
+    with snapshot_lock:
+        if snapshot is None:
+            snapshot = make_snapshot(load_registry())
+        elif now - snapshot_checked >= REFRESH_SECS:
+            registry = dbc.read_one(ROLE_COLLECT,
+                                    {dbc.MONGO_ID: REGISTRY_ID},
+                                    fields=[VERSION])
+            if registry is None or registry[VERSION] != snapshot.version:
+                snapshot = make_snapshot(load_registry())
+        snapshot_checked = now
+    return snapshot
+
+
+def refresh():
+    """
+    Reload the snapshot now: after our own writes.
+    """
+    global snapshot, snapshot_checked
+    with snapshot_lock:
+        snapshot = make_snapshot(load_registry())
+        snapshot_checked = time.monotonic()
+    ppl.invalidate_masthead()
+
+
 def read() -> dict:
-    return deepcopy(ROLES)
+    """
+    The roles, keyed by code. Shared, so read-only.
+    """
+    return get_snapshot().roles
 
 
 def get_roles() -> dict:
@@ -64,40 +176,49 @@ def get_roles() -> dict:
 
 
 def get_masthead_roles() -> dict:
-    mh_roles = get_roles()
-    del_mh_roles = []
-    for role in mh_roles:
-        if role not in MH_ROLES:
-            del_mh_roles.append(role)
-    for del_role in del_mh_roles:
-        del mh_roles[del_role]
-    return mh_roles
+    return get_snapshot().mh_roles
 
 
-def create_role(key: str, role: str):
+def create_role(key: str, role: str, masthead: bool = False):
     """
-    Adding a role to the existing ones in the ROLES dictionary
+    Adding a role to the existing ones in the registry
     """
-    if key in ROLES:
-        return f"Key {key} already exists with {ROLES[key]}"
-    elif role in ROLES.values():
+    roles = read()
+    if key in roles:
+        return f"Key {key} already exists with {roles[key]}"
+    elif role in roles.values():
         return f"Role {role} already exists"
     if is_valid_key(key) and is_valid_role(role):
-        ROLES[key] = role
+        update = {'$set': {f'{CODES}.{key}': role}, '$inc': {VERSION: 1}}
+        if masthead:
+            update['$addToSet'] = {MH_CODES: key}
+        ret = dbc.update_ops(ROLE_COLLECT,
+                             {dbc.MONGO_ID: REGISTRY_ID,
+                              f'{CODES}.{key}': {'$exists': False}},
+                             update)
+        refresh()
+        if not ret.modified_count:
+            return f"Key {key} already exists"
     return key
 
 
 def delete_role(code):
     """
-    Deleting roles from the ROLES dictionary
+    Deleting roles from the registry
     only allowed if the role is not in use
     """
     if is_in_use(code):
         raise ValueError(f"{code} is being used by"
                          + f"{roles_in_use(code)} people")
     if is_valid(code):
-        del ROLES[code]
-        return code
+        ret = dbc.update_ops(ROLE_COLLECT,
+                             {dbc.MONGO_ID: REGISTRY_ID,
+                              f'{CODES}.{code}': {'$exists': True}},
+                             {'$unset': {f'{CODES}.{code}': ''},
+                              '$pull': {MH_CODES: code},
+                              '$inc': {VERSION: 1}})
+        refresh()
+        return code if ret.modified_count else None
     else:
         return None
 
@@ -106,61 +227,59 @@ def roles_in_use(role_code) -> int:
     """
     couting how many people in the DB use the role
     """
-    people = ppl.read()
-    count = 0
-    for person in people.values():
-        if role_code in person.get('roles', []):
-            count += 1
-    return count
+    return ppl.count_with_role(role_code)
+
+
+def get_role_counts() -> dict:
+    """
+    How many people have each role, in one query.
+    Roles nobody has count 0.
+    """
+    counts = ppl.count_roles()
+    return {code: counts.get(code, 0) for code in read()}
 
 
 def is_in_use(role_code) -> bool:
     """
     checking if the role is being used in the people DB
     """
-    people = ppl.read()
-    for person in people.values():
-        if role_code in person.get('roles', []):
-            return True
-    return False
+    return ppl.any_with_role(role_code)
 
 
 def is_valid(code: str) -> bool:
     """
-    checking if the role exist in ROLES dict
+    checking if the role exists in the registry
     """
-    return code in ROLES
+    return code in get_snapshot().codes
 
 
 def get_role_codes() -> list:
-    return list(ROLES.keys())
+    return list(read())
 
 
 def has_role(email: str, code: str) -> bool:
     """
     Checks if a specific person(by email) has the given role
     """
-    people = ppl.read()
-    person = people.get(email)
-    if person is not None and code in person.get('roles', []):
-        return True
-    return False
+    return ppl.lookup_role(email, code)
+
+
+def is_referee(email: str) -> bool:
+    """
+    Checks if a person can referee: one cached, indexed lookup.
+    """
+    return ppl.is_in_role(email, REF_CODE)
 
 
 def get_emails_with_role(code: str) -> list:
     """
     Returns a list of emails of all people who have a specific role.
     """
-    all_roles = get_roles()
-    if code not in all_roles:
+    if not is_valid(code):
         raise ValueError(f"Role '{code} does not exist")
-    if not is_in_use(code):
+    emails = ppl.emails_with_role(code)
+    if not emails:
         raise LookupError(f"No people found with role {code}")
-    people = ppl.read()
-    emails = []
-    for email, person in people.items():
-        if code in person.get('roles', []):
-            emails.append(email)
     return emails
 
 
@@ -0,0 +1,44 @@
+import pytest
+
+import data.bodies as bds
+
+TEST_MANU_ID = 'bodies_test_manu'
+TEST_TEXT = 'Some text ' * 1000
+
+
+@pytest.fixture(scope='function')
+def temp_body():
+    bds.save_text(TEST_MANU_ID, TEST_TEXT)
+    yield TEST_MANU_ID
+    bds.delete_all(TEST_MANU_ID)
+
+
+def test_get_filename():
+    assert bds.get_filename('abc', bds.TEXT_NAME) == 'abc/text'
+
+
+def test_read_text(temp_body):
+    assert bds.read_text(temp_body) == TEST_TEXT
+
+
+def test_read_text_missing():
+    assert bds.read_text('no such manuscript') is None
+
+
+def test_save_replaces(temp_body):
+    bds.save_text(temp_body, 'New text')
+    assert bds.read_text(temp_body) == 'New text'
+    assert len(bds.list_bodies(temp_body)) == 1
+
+
+def test_open_body_seek(temp_body):
+    with bds.open_body(temp_body, bds.TEXT_NAME) as body:
+        assert body.length == len(TEST_TEXT)
+        body.seek(5)
+        assert body.read(4) == b'text'
+
+
+def test_delete_all(temp_body):
+    bds.save(temp_body, 'figure.png', b'\x89PNG', 'image/png')
+    assert bds.delete_all(temp_body) == 2
+    assert bds.list_bodies(temp_body) == []
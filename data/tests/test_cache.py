@@ -0,0 +1,61 @@
+import data.cache as cache
+
+
+def test_get_miss_then_hit():
+    tc = cache.TTLCache()
+    assert tc.get('key', lambda: 1) == 1
+    assert tc.get('key', lambda: 2) == 1
+    stats = tc.stats()
+    assert stats[cache.HITS] == 1
+    assert stats[cache.MISSES] == 1
+
+
+def test_get_expired():
+    tc = cache.TTLCache(ttl=0)
+    assert tc.get('key', lambda: 1) == 1
+    assert tc.get('key', lambda: 2) == 2
+    assert tc.stats()[cache.MISSES] == 2
+
+
+def test_invalidate_key():
+    tc = cache.TTLCache()
+    tc.get('key', lambda: 1)
+    tc.get('other', lambda: 1)
+    tc.invalidate('key')
+    assert tc.get('key', lambda: 2) == 2
+    assert tc.get('other', lambda: 2) == 1
+
+
+def test_invalidate_all():
+    tc = cache.TTLCache()
+    tc.get('key', lambda: 1)
+    tc.invalidate()
+    assert tc.stats()[cache.SIZE] == 0
+
+
+def test_invalidate_during_compute():
+    tc = cache.TTLCache()
+
+    def compute():
+        tc.invalidate()
+        return 'stale'
+
+    assert tc.get('key', compute) == 'stale'
+    assert tc.get('key', lambda: 'fresh') == 'fresh'
+
+
+def test_expired_pruned_on_insert():
+    tc = cache.TTLCache(ttl=0)
+    for i in range(100):
+        tc.get(i, lambda: i)
+    assert tc.stats()[cache.SIZE] == 1
+
+
+def test_max_size():
+    tc = cache.TTLCache(max_size=3)
+    for i in range(5):
+        tc.get(i, lambda: i)
+    assert tc.stats()[cache.SIZE] == 3
+    # the oldest went first
+    assert tc.get(0, lambda: 'recomputed') == 'recomputed'
+    assert tc.get(4, lambda: 'recomputed') == 4
@@ -0,0 +1,83 @@
+import pytest
+
+import data.db_connect as dbc
+
+
+def test_get_pool_options_defaults(monkeypatch):
+    for env_var in dbc.POOL_SETTINGS:
+        monkeypatch.delenv(env_var, raising=False)
+    opts = dbc.get_pool_options()
+    assert opts['maxPoolSize'] > 1
+    assert 'compressors' not in opts
+
+
+def test_get_pool_options_from_env(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '64')
+    monkeypatch.setenv('MONGO_COMPRESSORS', 'zlib')
+    opts = dbc.get_pool_options()
+    assert opts['maxPoolSize'] == 64
+    assert opts['compressors'] == 'zlib'
+
+
+def test_get_pool_options_bad_int(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', 'lots')
+    with pytest.raises(ValueError):
+        dbc.get_pool_options()
+
+
+def test_pool_metrics():
+    metrics = dbc.PoolMetrics()
+    metrics.connection_created(None)
+    metrics.connection_checked_out(None)
+    metrics.connection_checked_out(None)
+    metrics.connection_checked_in(None)
+    stats = metrics.stats()
+    assert stats[dbc.OPEN] == 1
+    assert stats[dbc.CHECKED_OUT] == 1
+    assert stats[dbc.MAX_CHECKED_OUT] == 2
+
+
+def test_connect_db_reuses_client():
+    assert dbc.connect_db() is dbc.connect_db()
+
+
+def test_connect_db_after_fork(monkeypatch):
+    parent_client = dbc.connect_db()
+    # pretend the client was made by some other (parent) process
+    monkeypatch.setattr(dbc, 'client_pid', -1)
+    assert dbc.connect_db() is not parent_client
+
+
+def test_page_token_object_id():
+    _id = dbc.ObjectId()
+    token = dbc.encode_page_token('Some Title', _id)
+    assert dbc.decode_page_token(token) == ('Some Title', _id)
+
+
+def test_page_token_string_id():
+    # 12 characters, so ObjectId.is_valid would take it for one
+    _id = 'ab@nyu.edu12'
+    token = dbc.encode_page_token('Some Name', _id)
+    assert dbc.decode_page_token(token) == ('Some Name', _id)
+
+
+def test_page_token_bad():
+    with pytest.raises(ValueError):
+        dbc.decode_page_token('not a token')
+
+
+@pytest.mark.parametrize('fields, expected', [
+    (None, None),
+    (['name'], {'name': 1, 'email': 1}),
+    (['email', 'name'], {'email': 1, 'name': 1}),
+    ({'name': 1}, {'name': 1, 'email': 1}),
+    ({'_id': 0}, {'_id': 0}),
+    ({'email': 0, 'password': 0}, {'password': 0}),
+])
+def test_include_field(fields, expected):
+    assert dbc.include_field(fields, 'email') == expected
+
+
+def test_include_field_id_for_paging():
+    fields = dbc.include_field({'_id': 0}, 'email')
+    assert dbc.include_field(fields, dbc.MONGO_ID) == {}
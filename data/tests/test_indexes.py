@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+import pymongo as pm
+
+import data.indexes as idx
+
+
+def test_indexes_declared():
+    for collection, specs in idx.INDEXES.items():
+        assert isinstance(collection, str)
+        for spec in specs:
+            assert idx.NAME in spec
+            assert idx.KEYS in spec
+            assert idx.SAMPLE in spec
+
+
+def test_has_stage():
+    plan = {
+        'stage': 'FETCH',
+        'inputStage': {'stage': 'IXSCAN'},
+    }
+    assert idx.has_stage(plan, 'IXSCAN')
+    assert not idx.has_stage(plan, idx.COLLSCAN)
+
+
+def test_ensure_indexes():
+    assert idx.ensure_indexes() == {}
+
+
+def test_check():
+    idx.ensure_indexes()
+    report = idx.check()
+    assert report[idx.MISSING] == []
+    assert report[idx.COLLSCANS] == []
+
+
+@patch('data.db_connect.create_index', autospec=True,
+       side_effect=pm.errors.ServerSelectionTimeoutError('DB is down'))
+def test_ensure_indexes_no_db(mock_create_index):
+    errors = idx.ensure_indexes()
+    # one error, not one timeout per index
+    assert len(errors) == 1
+    mock_create_index.assert_called_once()
+
+
+@patch('data.db_connect.explain', autospec=True)
+@patch('data.db_connect.index_information', autospec=True,
+       return_value={'_id_': {'key': [('_id', 1)]}})
+def test_check_missing_skips_explain(mock_index_info, mock_explain):
+    report = idx.check()
+    assert f'{idx.manu.MANU_COLLECT}.text_search' in report[idx.MISSING]
+    assert report[idx.COLLSCANS] == []
+    mock_explain.assert_not_called()
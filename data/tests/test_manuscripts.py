@@ -0,0 +1,229 @@
+from unittest.mock import patch
+
+import pytest
+
+import data.manuscripts as manu
+import data.people as ppl
+import data.recommend as rec
+import data.revisions as revs
+
+TEST_EMAIL = 'manu_author@nyu.edu'
+TEST_TITLE = 'A Test Manuscript Title'
+TEST_REFEREE = 'referee@nyu.edu'
+
+
+@pytest.fixture(scope='function')
+def temp_manu():
+    ppl.create('Manu Author', 'NYU', TEST_EMAIL, 'AU')
+    manu.create(TEST_TITLE, TEST_EMAIL, 'An abstract', 'Some text')
+    manu_obj = manu.read_one(TEST_TITLE)
+    yield manu_obj
+    manu.delete(TEST_TITLE)
+    ppl.delete(TEST_EMAIL)
+
+
+def test_assign_ref_update():
+    filt, update = manu.assign_ref_update(TEST_REFEREE)
+    assert filt == {manu.REFEREES: {'$ne': TEST_REFEREE}}
+    assert update[0]['$set'][manu.CURR_STATE] == manu.IN_REF_REV
+    # older docs may have no referees list at all
+    new_refs = update[0]['$set'][manu.REFEREES]['$concatArrays']
+    assert new_refs == [{'$ifNull': [f'${manu.REFEREES}', []]},
+                        [TEST_REFEREE]]
+
+
+def test_handle_action_bad_state():
+    with pytest.raises(ValueError):
+        manu.handle_action('some id', 'Not a state', manu.ACCEPT)
+
+
+def test_handle_action_bad_action():
+    with pytest.raises(ValueError):
+        manu.handle_action('some id', manu.SUBMITTED, manu.ACCEPT)
+
+
+def test_handle_action_assign_ref(temp_manu):
+    new_state = manu.handle_action(temp_manu[manu.MANU_ID], manu.SUBMITTED,
+                                   manu.ASSIGN_REF, referee=TEST_REFEREE)
+    assert new_state == manu.IN_REF_REV
+    manu_obj = manu.read_one(TEST_TITLE)
+    assert manu_obj[manu.REFEREES] == [TEST_REFEREE]
+    assert manu_obj[manu.CURR_STATE] == manu.IN_REF_REV
+
+
+def test_handle_action_delete_last_ref(temp_manu):
+    manu_id = temp_manu[manu.MANU_ID]
+    manu.handle_action(manu_id, manu.SUBMITTED, manu.ASSIGN_REF,
+                       referee=TEST_REFEREE)
+    new_state = manu.handle_action(manu_id, manu.IN_REF_REV,
+                                   manu.DELETE_REF, referee=TEST_REFEREE)
+    assert new_state == manu.SUBMITTED
+
+
+def test_handle_action_stale_state(temp_manu):
+    manu_id = temp_manu[manu.MANU_ID]
+    manu.handle_action(manu_id, manu.SUBMITTED, manu.REJECT)
+    with pytest.raises(ValueError):
+        manu.handle_action(manu_id, manu.SUBMITTED, manu.REJECT)
+
+
+def test_with_version_bump():
+    update = manu.with_version_bump({'$set': {manu.CURR_STATE: manu.REJECTED}})
+    assert update['$inc'] == {manu.VERSION: 1}
+    pipeline = manu.with_version_bump([])
+    assert manu.VERSION in pipeline[-1]['$set']
+
+
+def test_handle_action_bumps_version(temp_manu):
+    manu.handle_action(temp_manu[manu.MANU_ID], manu.SUBMITTED, manu.REJECT,
+                       version=0)
+    assert manu.read_one(TEST_TITLE)[manu.VERSION] == 1
+
+
+def test_handle_action_stale_version(temp_manu):
+    manu_id = temp_manu[manu.MANU_ID]
+    manu.handle_action(manu_id, manu.SUBMITTED, manu.ASSIGN_REF,
+                       version=0, referee=TEST_REFEREE)
+    with pytest.raises(manu.ConflictError):
+        manu.handle_action(manu_id, manu.IN_REF_REV, manu.ACCEPT, version=0)
+
+
+@patch('data.db_connect.aggregate', autospec=True, return_value=[
+    {manu.MANU_ID: manu.SUBMITTED, 'count': 3},
+])
+def test_count_by_state(mock_aggregate):
+    counts = manu.count_by_state(referee=TEST_REFEREE)
+    assert counts[manu.SUBMITTED] == 3
+    assert counts[manu.PUBLISHED] == 0
+    assert set(counts) == set(manu.VALID_STATE_LABELS)
+    match = mock_aggregate.call_args.args[1][0]['$match']
+    assert match[manu.REFEREES] == TEST_REFEREE
+
+
+def test_get_state_counts(temp_manu):
+    manu.state_counts_cache.invalidate()
+    counts = manu.get_state_counts(author_email=TEST_EMAIL)
+    assert counts[manu.SUBMITTED] == 1
+
+
+def test_search_manuscripts(temp_manu):
+    results = manu.search_manuscripts('Test Manuscript')
+    assert TEST_TITLE in [result[manu.TITLE] for result in results]
+    for result in results:
+        assert manu.TEXT not in result
+        assert manu.SCORE in result
+
+
+def test_typeahead(temp_manu):
+    assert TEST_TITLE in manu.typeahead('a test manu')
+
+
+def test_update_title(temp_manu):
+    new_title = 'A Renamed Test Manuscript'
+    manu.update_title(TEST_TITLE, new_title)
+    assert new_title in manu.typeahead('renamed')
+    assert TEST_TITLE not in manu.typeahead('a test manu')
+    manu.update_title(new_title, TEST_TITLE)
+
+
+def test_create_stores_text_in_gridfs(temp_manu):
+    assert manu.TEXT not in temp_manu
+    assert manu.read_text(TEST_TITLE) == 'Some text'
+
+
+def test_read_text_missing():
+    assert manu.read_text('No Such Manuscript Title') is None
+
+
+def test_update_text(temp_manu):
+    assert manu.update_text(TEST_TITLE, 'Some new text') == 1
+    assert manu.read_text(TEST_TITLE) == 'Some new text'
+    manu_id = temp_manu[manu.MANU_ID]
+    assert revs.get_revision(manu_id, 0) == 'Some text'
+
+
+def test_update_text_missing():
+    with pytest.raises(ValueError):
+        manu.update_text('No Such Manuscript Title', 'Some text')
+
+
+@patch('data.db_connect.find', autospec=True, return_value=[
+    {manu.TITLE: 'One', manu.CURR_STATE: manu.IN_REF_REV},
+    {manu.TITLE: 'Two', manu.CURR_STATE: manu.IN_REF_REV},
+])
+def test_get_referee_manuscripts(mock_find):
+    ret = manu.get_referee_manuscripts(TEST_REFEREE)
+    assert len(ret[manu.MANUSCRIPTS]) == 2
+    assert ret[manu.COUNTS][manu.IN_REF_REV] == 2
+    assert manu.PUBLISHED not in ret[manu.COUNTS]
+    filt = mock_find.call_args.args[1]
+    assert filt[manu.REFEREES] == TEST_REFEREE
+    assert manu.REJECTED not in filt[manu.CURR_STATE]['$in']
+
+
+REC_MODEL = rec.Recommender.build([
+    ('m1', 'Database query planning', ['near@nyu.edu', 'busy@nyu.edu']),
+    ('m2', 'Database index tuning', ['same@nyu.edu', 'free@nyu.edu']),
+])
+
+
+@patch('data.manuscripts.count_active_by_referee', autospec=True,
+       side_effect=lambda emails: {email: 3 if email == 'busy@nyu.edu'
+                                   else 0 for email in emails})
+@patch('data.people.read_many', autospec=True, return_value=[
+    {ppl.EMAIL: email, ppl.AFFILIATION: 'NYU' if email == 'same@nyu.edu'
+     else 'MIT'}
+    for email in ['near@nyu.edu', 'busy@nyu.edu', 'same@nyu.edu',
+                  'free@nyu.edu']])
+@patch('data.people.read_one', autospec=True,
+       return_value={ppl.AFFILIATION: 'NYU'})
+@patch('data.manuscripts.get_recommender', autospec=True,
+       return_value=REC_MODEL)
+@patch('data.manuscripts.read_one', autospec=True, return_value={
+    manu.TITLE: 'Planning database queries', manu.ABSTRACT: '',
+    manu.AUTHOR_EMAIL: TEST_EMAIL, manu.REFEREES: ['free@nyu.edu']})
+def test_recommend_referees(mock_read_one, mock_get_recommender,
+                            mock_read_person, mock_read_many, mock_loads):
+    recs = manu.recommend_referees(TEST_TITLE)
+    # busy is overloaded, same is at the author's affiliation,
+    # and free is already refereeing this one
+    assert [found[ppl.EMAIL] for found in recs] == ['near@nyu.edu']
+
+
+@patch('data.manuscripts.read_one', autospec=True, return_value=None)
+def test_recommend_referees_missing(mock_read_one):
+    with pytest.raises(ValueError):
+        manu.recommend_referees(TEST_TITLE)
+
+
+@patch('data.bodies.save_text', autospec=True)
+@patch('data.revisions.add', autospec=True,
+       side_effect=revs.ConflictError('Revision 2 was saved first'))
+@patch('data.revisions.latest_rev', autospec=True, return_value=1)
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_update_text_conflict_keeps_body(mock_read_one, mock_latest_rev,
+                                         mock_add, mock_save_text):
+    with pytest.raises(manu.ConflictError):
+        manu.update_text(TEST_TITLE, 'Some new text')
+    mock_save_text.assert_not_called()
+
+
+@patch('data.manuscripts.handle_action', autospec=True,
+       return_value=manu.IN_REF_REV)
+@patch('data.db_connect.read_one', autospec=True,
+       return_value={manu.CURR_STATE: manu.SUBMITTED})
+def test_assign_ref_logs_transition(mock_read_one, mock_handle_action):
+    assert manu.assign_ref('some id', TEST_REFEREE,
+                           actor='editor@nyu.edu') == manu.IN_REF_REV
+    mock_handle_action.assert_called_once_with(
+        'some id', manu.SUBMITTED, manu.ASSIGN_REF,
+        referee=TEST_REFEREE, actor='editor@nyu.edu')
+
+
+@patch('data.manuscripts.handle_action', autospec=True)
+@patch('data.db_connect.read_one', autospec=True, return_value=None)
+def test_delete_ref_missing(mock_read_one, mock_handle_action):
+    with pytest.raises(ValueError):
+        manu.delete_ref('some id', TEST_REFEREE)
+    mock_handle_action.assert_not_called()
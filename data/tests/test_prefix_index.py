@@ -0,0 +1,71 @@
+import data.prefix_index as pidx
+
+TITLE = 'Short module import names in Python'
+AUTHOR = 'Eugene Callahan'
+OTHER_TITLE = 'Écoles normales'
+
+
+def make_index():
+    return pidx.PrefixIndex.build([
+        (TITLE, TITLE, AUTHOR),
+        (OTHER_TITLE, OTHER_TITLE, 'Someone Else'),
+    ])
+
+
+def test_normalize():
+    assert pidx.normalize('  Écoles   NORMALES ') == 'ecoles normales'
+
+
+def test_make_terms_bounded():
+    terms = pidx.make_terms(' '.join(f'word{i}' for i in range(100)))
+    assert len(terms) == pidx.MAX_TERMS_PER_ENTRY
+    for term in terms:
+        assert len(term) <= pidx.MAX_TERM_LEN
+
+
+def test_search_title_prefix():
+    assert make_index().search('short mod') == [TITLE]
+
+
+def test_search_word_prefix():
+    assert make_index().search('IMP') == [TITLE]
+
+
+def test_search_author():
+    assert make_index().search('callah') == [TITLE]
+
+
+def test_search_accents():
+    assert make_index().search('ecol') == [OTHER_TITLE]
+
+
+def test_search_no_match():
+    assert make_index().search('zebra') == []
+
+
+def test_search_empty_prefix():
+    assert make_index().search('  ') == []
+
+
+def test_search_limit():
+    index = pidx.PrefixIndex()
+    for i in range(20):
+        index.add(f'Title {i}')
+    assert len(index.search('title', limit=5)) == 5
+
+
+def test_add_remove():
+    index = make_index()
+    index.add('Python packaging', 'Python packaging', AUTHOR)
+    assert set(index.search('python')) == {TITLE, 'Python packaging'}
+    index.remove(TITLE)
+    assert index.search('python') == ['Python packaging']
+    assert index.search('callah') == ['Python packaging']
+    assert len(index) == 2
+
+
+def test_add_again_replaces():
+    index = make_index()
+    index.add(TITLE, TITLE, 'New Author')
+    assert index.search('callah') == []
+    assert index.search('new auth') == [TITLE]
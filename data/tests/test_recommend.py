@@ -0,0 +1,76 @@
+import pytest
+
+import data.recommend as rec
+
+DOCS = [
+    ('m1', 'Query planning for database indexes', ['db@nyu.edu']),
+    ('m2', 'Database index tuning and query plans', ['db@nyu.edu']),
+    ('m3', 'Protein folding with molecular dynamics', ['bio@nyu.edu']),
+    ('m4', 'Molecular dynamics of protein membranes', ['bio@nyu.edu',
+                                                       'db@nyu.edu']),
+]
+
+
+@pytest.fixture(scope='function')
+def model():
+    return rec.Recommender.build(DOCS)
+
+
+def test_tokenize():
+    assert rec.tokenize('The Query-Planner, v2!') == ['query', 'planner']
+
+
+def test_weigh_unit_length(model):
+    vector = model.weigh(rec.Counter(['query', 'query', 'protein']))
+    assert sum(weight * weight for weight in vector.values()) == \
+        pytest.approx(1)
+
+
+def test_weigh_empty(model):
+    assert model.weigh(rec.Counter()) == {}
+
+
+def test_recommend(model):
+    ranked = model.recommend('Choosing database indexes for queries')
+    assert ranked[0][0] == 'db@nyu.edu'
+    ranked = model.recommend('Simulating protein dynamics')
+    assert ranked[0][0] == 'bio@nyu.edu'
+
+
+def test_recommend_scores_are_cosines(model):
+    for referee, score in model.recommend('protein database query'):
+        assert 0 < score <= 1 + 1e-9
+
+
+def test_recommend_exclude(model):
+    ranked = model.recommend('database indexes', exclude=['db@nyu.edu'])
+    assert 'db@nyu.edu' not in dict(ranked)
+
+
+def test_recommend_no_match(model):
+    assert model.recommend('medieval poetry') == []
+
+
+def test_add_doc(model):
+    model.add_doc('m5', 'Medieval poetry and its meters', ['lit@nyu.edu'])
+    assert model.recommend('medieval poetry')[0][0] == 'lit@nyu.edu'
+
+
+def test_remove_doc(model):
+    model.remove_doc('m3')
+    model.remove_doc('m4')
+    assert 'bio@nyu.edu' not in model.vectors
+    assert model.recommend('protein') == []
+
+
+def test_add_remove_referee(model):
+    model.add_referee('m3', 'new@nyu.edu')
+    assert 'new@nyu.edu' in dict(model.recommend('protein folding'))
+    model.remove_referee('m3', 'new@nyu.edu')
+    assert 'new@nyu.edu' not in dict(model.recommend('protein folding'))
+
+
+def test_update_doc(model):
+    model.update_doc('m3', 'Medieval poetry')
+    assert model.doc_refs['m3'] == {'bio@nyu.edu'}
+    assert model.recommend('poetry')[0][0] == 'bio@nyu.edu'
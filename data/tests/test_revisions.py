@@ -0,0 +1,76 @@
+import pytest
+
+import data.revisions as revs
+
+TEST_MANU_ID = 'revisions_test_manu'
+OLD_TEXT = 'line one\nline two\nline three\n'
+NEW_TEXT = 'line one\nline 2\nline three\nline four\n'
+
+
+@pytest.fixture(scope='function')
+def temp_history():
+    revs.add(TEST_MANU_ID, OLD_TEXT)
+    revs.add(TEST_MANU_ID, NEW_TEXT)
+    yield TEST_MANU_ID
+    revs.delete_all(TEST_MANU_ID)
+
+
+def test_delta_round_trip():
+    old_lines = revs.split_lines(OLD_TEXT)
+    new_lines = revs.split_lines(NEW_TEXT)
+    ops = revs.make_delta(old_lines, new_lines)
+    assert ''.join(revs.apply_delta(old_lines, ops)) == NEW_TEXT
+
+
+def test_delta_copies_unchanged_lines():
+    old_lines = revs.split_lines(OLD_TEXT)
+    ops = revs.make_delta(old_lines, old_lines)
+    assert ops == [[revs.COPY, 0, len(old_lines)]]
+
+
+def test_delta_delete():
+    old_lines = revs.split_lines(OLD_TEXT)
+    ops = revs.make_delta(old_lines, old_lines[:1])
+    assert revs.apply_delta(old_lines, ops) == old_lines[:1]
+
+
+def test_apply_delta_bad_op():
+    with pytest.raises(ValueError):
+        revs.apply_delta([], [['?']])
+
+
+def test_compress_round_trip():
+    ops = [[revs.COPY, 0, 3], [revs.INSERT, ['a\n']]]
+    assert revs.decompress(revs.compress(ops)) == ops
+
+
+def test_delta_is_small():
+    old_lines = [f'line {i}\n' for i in range(1000)]
+    new_lines = old_lines[:500] + ['a new line\n'] + old_lines[500:]
+    delta = revs.compress(revs.make_delta(old_lines, new_lines))
+    assert len(delta) < len(revs.compress(new_lines)) / 10
+
+
+def test_get_revision(temp_history):
+    assert revs.latest_rev(temp_history) == 1
+    assert revs.get_revision(temp_history, 0) == OLD_TEXT
+    assert revs.get_revision(temp_history, 1) == NEW_TEXT
+
+
+def test_get_revision_missing(temp_history):
+    with pytest.raises(KeyError):
+        revs.get_revision(temp_history, 2)
+
+
+def test_snapshots(temp_history):
+    for i in range(revs.SNAPSHOT_EVERY):
+        revs.add(temp_history, NEW_TEXT + f'edit {i}\n')
+    rev = revs.SNAPSHOT_EVERY
+    assert revs.list_revisions(temp_history)[rev][revs.SNAPSHOT]
+    assert revs.get_revision(temp_history, rev + 1) == NEW_TEXT + 'edit 9\n'
+
+
+def test_diff(temp_history):
+    diff = revs.diff(temp_history, 0, 1)
+    assert '-line two\n' in diff
+    assert '+line 2\n' in diff
@@ -48,15 +48,18 @@ def test_get_role_codes():
 def test_is_valid():
     assert rls.is_valid(rls.TEST_CODE)
 
-@patch('data.people.read')
-def test_delete_rl_in_dict(mock_read,mock_people):
-    mock_read.return_value = mock_people
+@patch('data.people.any_with_role', return_value=False)
+def test_delete_rl_in_dict(mock_in_use):
     rls_before = rls.get_roles()
     original_length = len(rls_before)
     rls.delete_role(rls.CE_CODE)
     rls_after = rls.get_roles()
+    # the registry is shared now: put CE back for everyone else
+    rls.create_role(rls.CE_CODE, rls.DEFAULT_ROLES[rls.CE_CODE],
+                    masthead=True)
     assert len(rls_after) == original_length - 1, "The number of people did not decrease!"
     assert rls.CE_CODE not in rls_after
+    assert rls.CE_CODE in rls.get_masthead_roles()
 
 
 def test_delete_rl_in_dict_in_use(temp_person):
@@ -69,8 +72,10 @@ def test_create_rl_in_dict():
     original_length = len(rls_before)
     rls.create_role("AD", "Admin")
     rls_after = rls.get_roles()
+    rls.delete_role("AD")
     assert len(rls_after) == original_length + 1, "The number of people did not increase!"
     assert "AD" in rls_after
+    assert "AD" not in rls.get_roles()
 
 
 def test_create_rl_in_dict_bad_key():
@@ -95,27 +100,49 @@ def test_role_in_use_in_db(temp_person):
     assert rls.is_in_use('AU') is True
 
 
-@patch('data.people.read')  # This replaces ppl.read() with our mock function
-def test_roles_in_use(mock_read, mock_people):
-    mock_read.return_value = mock_people
+def count_role(mock_people, role):
+    return sum(role in person["roles"] for person in mock_people.values())
+
+
+@patch('data.db_connect.count')  # the count happens in the DB
+def test_roles_in_use(mock_count, mock_people):
+    mock_count.return_value = count_role(mock_people, 'AU')
     count = rls.roles_in_use('AU')
     assert count == 2, f"Expected 2, but got {count}"
+    mock_count.assert_called_once_with(ppl.PEOPLE_COLLECT, {ppl.ROLES: 'AU'})
 
 
-@patch('data.people.read')  # This replaces ppl.read() with our mock function
-def test_roles_in_not_use(mock_read, mock_people):
-    mock_read.return_value = mock_people
+@patch('data.db_connect.count')
+def test_roles_in_not_use(mock_count, mock_people):
+    mock_count.return_value = count_role(mock_people, 'CS')
     count = rls.roles_in_use('CS')
     assert count == 0, f"Expected 0, but got {count}"
 
 
-@patch('data.people.read')  # This replaces ppl.read() with our mock function
-def test_roles_in_not_use_in_role_options(mock_read, mock_people):
-    mock_read.return_value = mock_people
+@patch('data.db_connect.count')
+def test_roles_in_not_use_in_role_options(mock_count, mock_people):
+    mock_count.return_value = count_role(mock_people, 'RE')
     count = rls.roles_in_use('RE')
     assert count == 0, f"Expected 0, but got {count}"
 
 
+def test_roles_in_use_in_db(temp_person):
+    assert rls.roles_in_use('AU') >= 1
+
+
+@patch('data.roles.read', return_value=rls.DEFAULT_ROLES)
+@patch('data.db_connect.aggregate')
+def test_get_role_counts(mock_aggregate, mock_read, mock_people):
+    mock_aggregate.return_value = [
+        {'_id': code, 'count': count_role(mock_people, code)}
+        for code in ['AU', 'ED', 'ME']]
+    counts = rls.get_role_counts()
+    assert counts['AU'] == 2
+    assert counts['ED'] == 2
+    assert counts['RE'] == 0
+    assert set(counts) == set(rls.DEFAULT_ROLES)
+
+
 def test_has_role(temp_person):
     assert rls.has_role(temp_person,"ME") is False
 
@@ -130,15 +157,78 @@ def test_get_emails_with_role(temp_person):
     assert isinstance(emails, list), f"Expected a list, but got {type(emails)}"
 
 
-@patch("data.people.read")
-def test_get_emails_with_role(mock_read, mock_people):
-    mock_read.return_value = mock_people
+@patch("data.roles.is_valid", return_value=True)
+@patch("data.db_connect.distinct")
+def test_get_emails_with_role_one_query(mock_distinct, mock_valid,
+                                        mock_people):
+    mock_distinct.return_value = [email for email, person
+                                  in mock_people.items()
+                                  if "AU" in person["roles"]]
     emails = rls.get_emails_with_role("AU") 
     assert sorted(emails) == sorted(["user1@nyu.edu", "user2@nyu.edu"]), f"Unexpected result: {emails}"
 
 
-@patch("data.people.read")
-def test_get_emails_with_bad_role(mock_read, mock_people):
-    mock_read.return_value = mock_people
+@patch("data.roles.is_valid", return_value=False)
+@patch("data.db_connect.distinct")
+def test_get_emails_with_bad_role(mock_distinct, mock_valid):
     with pytest.raises(ValueError):
-        emails = rls.get_emails_with_role("XYZ") 
\ No newline at end of file
+        emails = rls.get_emails_with_role("XYZ") 
+
+@patch('data.people.lookup_role', autospec=True, return_value=True)
+def test_is_referee_cached(mock_lookup):
+    ppl.role_check_cache.invalidate()
+    assert rls.is_referee('ref@nyu.edu')
+    assert rls.is_referee('ref@nyu.edu')
+    mock_lookup.assert_called_once_with('ref@nyu.edu', rls.REF_CODE)
+
+
+TEST_REGISTRY = {
+    rls.CODES: {'AU': 'Author', 'ED': 'Editor', 'RE': 'Referee'},
+    rls.MH_CODES: ['ED', 'XX'],
+    rls.VERSION: 7,
+}
+
+
+def test_make_snapshot():
+    snap = rls.make_snapshot(TEST_REGISTRY)
+    assert snap.version == 7
+    assert isinstance(snap.roles, dict)
+    assert snap.roles == TEST_REGISTRY[rls.CODES]
+    # a masthead code with no role is dropped
+    assert snap.mh_roles == {'ED': 'Editor'}
+    assert snap.codes == {'AU', 'ED', 'RE'}
+
+
+def test_snapshot_read_only():
+    snap = rls.make_snapshot(TEST_REGISTRY)
+    with pytest.raises(TypeError):
+        snap.roles['AD'] = 'Admin'
+    with pytest.raises(TypeError):
+        del snap.mh_roles['ED']
+
+
+@patch('data.db_connect.read_one', return_value={rls.VERSION: 7})
+def test_get_snapshot_zero_copy(mock_read_one):
+    rls.snapshot = rls.make_snapshot(TEST_REGISTRY)
+    rls.snapshot_checked = 0
+    try:
+        assert rls.read() is rls.read()
+        assert rls.is_valid('RE')
+        assert not rls.is_valid('ME')
+        # one version check, and no reload: the version hasn't changed
+        assert mock_read_one.call_count == 1
+    finally:
+        rls.snapshot = None
+
+
+@patch('data.roles.load_registry', return_value={**TEST_REGISTRY,
+                                                 rls.VERSION: 8})
+@patch('data.db_connect.read_one', return_value={rls.VERSION: 8})
+def test_get_snapshot_reloads_on_version_bump(mock_read_one, mock_load):
+    rls.snapshot = rls.make_snapshot(TEST_REGISTRY)
+    rls.snapshot_checked = 0
+    try:
+        assert rls.get_snapshot().version == 8
+        mock_load.assert_called_once()
+    finally:
+        rls.snapshot = None
@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+import data.transitions as trans
+
+TEST_ID = 'some manuscript id'
+
+
+def make_rec(to_state='REV') -> dict:
+    return {
+        trans.MANU_ID: TEST_ID,
+        trans.FROM_STATE: 'SUB',
+        trans.TO_STATE: to_state,
+    }
+
+
+@patch('data.db_connect.insert_many', autospec=True)
+def test_flush(mock_insert_many):
+    buf = trans.TransitionBuffer(flush_secs=60)
+    buf.add(make_rec())
+    buf.add(make_rec())
+    assert buf.pending() == 2
+    assert buf.flush() == 2
+    assert buf.pending() == 0
+    mock_insert_many.assert_called_once()
+    assert len(mock_insert_many.call_args.args[1]) == 2
+
+
+@patch('data.db_connect.insert_many', autospec=True)
+def test_flush_empty(mock_insert_many):
+    buf = trans.TransitionBuffer(flush_secs=60)
+    assert buf.flush() == 0
+    mock_insert_many.assert_not_called()
+
+
+@patch('data.db_connect.insert_many', autospec=True)
+def test_flush_on_size(mock_insert_many):
+    buf = trans.TransitionBuffer(flush_size=2, flush_secs=60)
+    buf.add(make_rec())
+    buf.add(make_rec())
+    buf.thread.join(timeout=0.5)  # the flusher loops forever: just wait
+    assert buf.pending() == 0
+    mock_insert_many.assert_called_once()
+
+
+@patch('data.db_connect.insert_many', autospec=True,
+       side_effect=trans.pm.errors.AutoReconnect('DB is down'))
+def test_flush_failure_keeps_records(mock_insert_many):
+    buf = trans.TransitionBuffer(flush_secs=60)
+    buf.add(make_rec())
+    assert buf.flush() == 0
+    assert buf.pending() == 1
+
+
+def test_record():
+    buf = trans.TransitionBuffer(flush_secs=60)
+    with patch.object(trans, 'buffer', buf):
+        trans.record(TEST_ID, 'SUB', 'REV', 'ARF', actor='editor@nyu.edu')
+    assert buf.pending() == 1
+    rec = buf.records[0]
+    assert rec[trans.TO_STATE] == 'REV'
+    assert rec[trans.ACTOR] == 'editor@nyu.edu'
+    assert trans.TIMESTAMP in rec
+
+
+def test_flush_partial_failure_requeues_only_failed():
+    buf = trans.TransitionBuffer(flush_secs=60)
+    for state in ['REV', 'EDT', 'PUB']:
+        buf.add(make_rec(state))
+    err = trans.pm.errors.BulkWriteError({
+        'nInserted': 1,
+        'writeErrors': [
+            {'index': 1, 'code': trans.DUPLICATE_KEY, 'errmsg': 'dup'},
+            {'index': 2, 'code': 2, 'errmsg': 'bad'},
+        ],
+    })
+    with patch('data.db_connect.insert_many', autospec=True,
+               side_effect=err):
+        assert buf.flush() == 1
+    assert buf.pending() == 1
+    assert buf.records[0][trans.TO_STATE] == 'PUB'
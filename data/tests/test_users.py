@@ -70,4 +70,21 @@ def test_update_user_level():
         assert False, "Expected ValueError for non-existent user"
 
 
+def test_read_all_no_password():
+    email = "test_read_all_user@nyu.edu"
+    usrs.create_user(email, "ReadAll", "testpass")
+    users = usrs.read_all(fields=usrs.PUBLIC_FIELDS)
+    assert email in users
+    assert usrs.PASSWORD not in users[email]
+    usrs.delete_user(email)
+
 
+def test_login():
+    email = "test_login_user@nyu.edu"
+    usrs.create_user(email, "LogIn", "testpass")
+    user = usrs.login(email, "testpass")
+    assert user[usrs.NAME] == "LogIn"
+    assert usrs.PASSWORD not in user
+    assert usrs.login(email, "wrongpass") is None
+    assert usrs.login("nonexistent@nyu.edu", "testpass") is None
+    usrs.delete_user(email)
@@ -0,0 +1,150 @@
+"""
+This module keeps an append-only log of manuscript state transitions.
+Records are buffered in memory and written in batches by a background
+thread, so logging never adds a DB round trip to an action.
+The price is that a transition shows up in queries up to FLUSH_SECS late.
+"""
+import atexit
+import os
+import threading
+from datetime import datetime, timezone
+
+import pymongo as pm
+
+import data.db_connect as dbc
+
+TRANS_COLLECT = 'manuscript_transitions'
+
+# fields
+MANU_ID = 'manu_id'
+FROM_STATE = 'from_state'
+TO_STATE = 'to_state'
+ACTION = 'action'
+ACTOR = 'actor'
+TIMESTAMP = 'timestamp'
+
+FLUSH_SIZE = 100  # write as soon as this many records are waiting
+FLUSH_SECS = 2.0  # ... or after this long
+MAX_BUFFERED = 10_000  # if the DB is down, drop the oldest beyond this
+DUPLICATE_KEY = 11000  # already written by an earlier, partly failed flush
+DEFAULT_LIMIT = 50
+
+
+class TransitionBuffer:
+    def __init__(self, flush_size=FLUSH_SIZE, flush_secs=FLUSH_SECS):
+        self.flush_size = flush_size
+        self.flush_secs = flush_secs
+        self.records = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def add(self, rec: dict):
+        with self.lock:
+            self.records.append(rec)
+            full = len(self.records) >= self.flush_size
+        self.start()
+        if full:
+            self.wake.set()
+
+    def start(self):
+        """
+        Start the flusher thread, once per process:
+        a forked worker does not inherit its parent's thread.
+        """
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_secs)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything buffered in one insert_many.
+        Returns the number of records written.
+        """
+        with self.lock:
+            batch, self.records = self.records, []
+        if not batch:
+            return 0
+        try:
+            dbc.insert_many(TRANS_COLLECT, batch)
+        except pm.errors.BulkWriteError as err:
+            # unordered, so every doc without a write error went in:
+            # retry only the real failures, or we'd re-insert the rest
+            failed = [batch[write_err['index']]
+                      for write_err in err.details.get('writeErrors', [])
+                      if write_err.get('code') != DUPLICATE_KEY]
+            print(f'Transition log flush: {len(failed)} records failed')
+            self.requeue(failed)
+            return err.details.get('nInserted', 0)
+        except pm.errors.PyMongoError as err:
+            print(f'Transition log flush failed: {err=}')
+            self.requeue(batch)
+            return 0
+        return len(batch)
+
+    def requeue(self, recs: list):
+        if not recs:
+            return
+        with self.lock:
+            self.records = (recs + self.records)[-MAX_BUFFERED:]
+
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.records)
+
+
+buffer = TransitionBuffer()
+atexit.register(buffer.flush)
+
+
+def record(manu_id, from_state: str, to_state: str,
+           action: str = None, actor: str = None):
+    """
+    Log a transition. Returns at once: the write happens in the background.
+    action is None for direct state changes that bypass the FSM.
+    """
+    buffer.add({
+        MANU_ID: manu_id,
+        FROM_STATE: from_state,
+        TO_STATE: to_state,
+        ACTION: action,
+        ACTOR: actor,
+        TIMESTAMP: datetime.now(timezone.utc),
+    })
+
+
+def to_json(rec: dict) -> dict:
+    rec[MANU_ID] = str(rec[MANU_ID])
+    rec[TIMESTAMP] = rec[TIMESTAMP].isoformat()
+    return rec
+
+
+def read_recent(filt: dict, limit: int) -> list:
+    recs = dbc.find(TRANS_COLLECT, filt,
+                    sort=[(TIMESTAMP, pm.DESCENDING)], limit=limit)
+    return [to_json(rec) for rec in recs]
+
+
+def recent_for_manuscript(manu_id, limit: int = DEFAULT_LIMIT) -> list:
+    """
+    Most recent transitions of one manuscript, newest first.
+    """
+    return read_recent({MANU_ID: manu_id}, limit)
+
+
+def recent_for_state(state: str, limit: int = DEFAULT_LIMIT) -> list:
+    """
+    Most recent transitions into state, newest first.
+    """
+    return read_recent({TO_STATE: state}, limit)
@@ -4,6 +4,7 @@ This module interfaces to our user data.
 
 # data/users.py
 import hashlib
+import hmac
 import data.db_connect as dbc
 
 # fields
@@ -21,8 +22,6 @@ TEST_UPDATE_LEVEL_BEFORE_UPDATE = 2
 TEST_UPDATE_LEVEL_AFTER_UPDATE = 9000
 USERS_COLLECT = 'users'  # MongoDB collection name
 
-client = dbc.connect_db()
-
 
 def get_users():
     """
@@ -102,21 +101,21 @@ def create_user(email: str, name: str, password: str, role: str = "AU"):
     return user
 
 
-def read_one(email: str):
-    return dbc.read_one(USERS_COLLECT, {EMAIL: email})
+def read_one(email: str, fields: list = None):
+    return dbc.read_one(USERS_COLLECT, {EMAIL: email}, fields=fields)
 
 
 def authenticate(email: str, password: str):
-    user = read_one(email)
+    user = read_one(email, fields=[PASSWORD])
     if not user:
         return False
     return user[PASSWORD] == hash_password(password)
 
 
 def update_user_level(email: str, new_level: int):
-    if not read_one(email):
+    ret = dbc.update(USERS_COLLECT, {EMAIL: email}, {LEVEL: new_level})
+    if ret.matched_count == 0:
         raise ValueError("User not found.")
-    dbc.update(USERS_COLLECT, {EMAIL: email}, {LEVEL: new_level})
     return email
 
 
@@ -129,10 +128,33 @@ def delete_user(email: str):
     Raises:
         KeyError: If the user does not exist.
     """
-    if not read_one(email):
+    del_count = dbc.del_one(USERS_COLLECT, {EMAIL: email})
+    if del_count == 0:
         raise ValueError("User not found.")
-    return dbc.del_one(USERS_COLLECT, {EMAIL: email})
+    return del_count
+
+
+# what we show about a user: never the password hash
+PUBLIC_FIELDS = [EMAIL, NAME, LEVEL, role]
+
+
+def login(email: str, password: str) -> dict:
+    """
+    Check a password and return the user's public fields, in one read.
+    Returns None if the email or password is wrong.
+    """
+    user = read_one(email, fields=PUBLIC_FIELDS + [PASSWORD])
+    if not user or not hmac.compare_digest(user.get(PASSWORD, ''),
+                                           hash_password(password)):
+        return None
+    return {field: user.get(field) for field in PUBLIC_FIELDS}
+
+
+def read_all(fields: list = None):
+    return dbc.read_dict(USERS_COLLECT, EMAIL, fields=fields)
 
 
-def read_all():
-    return dbc.read_dict(USERS_COLLECT, EMAIL)
+def read_page(limit: int, after: str = None, fields: list = None):
+    recs, next_token = dbc.read_page(USERS_COLLECT, EMAIL, limit,
+                                     after=after, fields=fields)
+    return {rec[EMAIL]: rec for rec in recs}, next_token
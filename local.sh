@@ -2,6 +2,8 @@
 export FLASK_ENV=development
 export PROJ_DIR=$PWD
 export DEBUG=1
+# session tokens need a signing key: any will do locally
+export SESSION_SECRET=${SESSION_SECRET:-local-dev-secret}
 
 # run our server locally:
 FLASK_APP=server.endpoints flask run --debug --host=127.0.0.1 --port=8000
@@ -14,6 +14,21 @@ source /home/$PA_USER/.virtualenvs/$VENV/bin/activate
 echo "Install packages"
 pip install --upgrade -r requirements.txt
 
+# wsgi.py reads the session token secret from here: make it once,
+# so tokens survive restarts and every worker shares it
+SECRET_FILE=~/.session_secret
+if [ ! -s $SECRET_FILE ]
+then
+    echo "Making the session token secret"
+    (umask 077; python -c 'import secrets; print(secrets.token_urlsafe(32))' > $SECRET_FILE)
+fi
+
+# a deploy step, not something the app does when it starts:
+# the app connects lazily, and must start even if Mongo is down
+echo "Creating any missing indexes"
+# (not make indexes: common.mk would set CLOUD_MONGO back to 0)
+CLOUD_MONGO=1 python -m data.indexes || echo "Index creation failed: see above"
+
 echo "Going to reboot the webserver using $API_TOKEN"
 pa_reload_webapp.py $PA_DOMAIN
 
@@ -1,7 +1,13 @@
-from flask import request, abort
+from flask import request, abort, g
 from functools import wraps
+from http import HTTPStatus
+import threading
+import time
 
-# import data.db_connect as dbc
+import pymongo as pm
+
+import data.db_connect as dbc
+import security.tokens as tkn
 
 """
 Our record format to meet our requirements (see security.md) will be:
@@ -69,7 +75,7 @@ PEOPLE_MISSING_ACTION = READ
 GOOD_USER_ID = 'ejc369@nyu.edu'
 
 security_recs = None
-# These will come from the DB soon:
+# What a new policy doc in the DB starts with:
 temp_recs = {
     PEOPLE: {
         CREATE: {
@@ -114,9 +120,12 @@ temp_recs = {
 
 def is_valid_key(user_id: str, login_key: str):
     """
-    This is just a mock of the real is_valid_key() we'll write later.
+    The login key is a session token from /login:
+    valid if its signature checks out, it is unexpired and unrevoked,
+    and it was issued to user_id. No DB access.
     """
-    return True
+    claims = tkn.verify(login_key)
+    return claims is not None and claims[tkn.SUB] == user_id
 
 
 def check_login(user_id: str, **kwargs):
@@ -142,10 +151,35 @@ CHECK_FUNCS = {
 }
 
 
+# The policy lives in one doc in COLLECT_NAME; writes bump its version.
+POLICY_ID = 'policy'
+FEATURES = 'features'
+VERSION = 'version'
+# how often a process checks the policy version
+REFRESH_SECS = 5
+
+
+def load_policy() -> dict:
+    """
+    Read the policy doc, creating it from temp_recs the first time.
+    """
+    policy = dbc.read_one(COLLECT_NAME, {dbc.MONGO_ID: POLICY_ID})
+    if policy is None:
+        try:
+            dbc.insert_one(COLLECT_NAME, {
+                dbc.MONGO_ID: POLICY_ID,
+                FEATURES: temp_recs,
+                VERSION: 0,
+            })
+        except pm.errors.DuplicateKeyError:
+            pass  # another worker got there first
+        policy = dbc.read_one(COLLECT_NAME, {dbc.MONGO_ID: POLICY_ID})
+    return policy
+
+
 def read() -> dict:
     global security_recs
-    # dbc.read()
-    security_recs = temp_recs
+    security_recs = get_policy().recs
     return security_recs
 
 
@@ -170,22 +204,223 @@ def read_feature(feature_name: str) -> dict:
         return None
 
 
-@needs_recs
+def bad_check(check: str):
+    def fail(user_id: str, **kwargs):
+        raise ValueError(f'Bad check passed to is_permitted: {check}')
+    return fail
+
+
+def compile_rule(protection: dict) -> tuple:
+    """
+    Returns (users, checks) for the protection of one (feature, action):
+    the user list as a frozenset (None means anyone),
+    and the check functions, looked up once, here.
+    """
+    users = protection.get(USER_LIST)
+    users = None if users is None else frozenset(users)
+    checks = tuple(CHECK_FUNCS.get(check) or bad_check(check)
+                   for check in protection.get(CHECKS, {}))
+    return users, checks
+
+
+def compile_decision(protection: dict):
+    """
+    Compile the protection of one (feature, action) into a function
+    of (user_id, **kwargs).
+    """
+    return make_decision(*compile_rule(protection))
+
+
+def make_decision(users: frozenset, checks: tuple):
+    """
+    The decision function for a rule from compile_rule.
+    """
+    # the common shapes get a function with no loop
+    if not checks:
+        def decide(user_id: str, **kwargs) -> bool:
+            return users is None or user_id in users
+    elif len(checks) == 1:
+        check = checks[0]
+
+        def decide(user_id: str, **kwargs) -> bool:
+            if users is not None and user_id not in users:
+                return False
+            return bool(check(user_id, **kwargs))
+    else:
+        def decide(user_id: str, **kwargs) -> bool:
+            if users is not None and user_id not in users:
+                return False
+            for check in checks:
+                if not check(user_id, **kwargs):
+                    return False
+            return True
+    return decide
+
+
+class Policy:
+    def __init__(self, recs: dict, version: int = 0):
+        self.recs = recs
+        self.version = version
+        self.rules = {(feature, action): compile_rule(protection)
+                      for feature, actions in recs.items()
+                      for action, protection in actions.items()}
+        # built from the rules, so each protection is compiled once
+        self.decisions = {key: make_decision(*rule)
+                          for key, rule in self.rules.items()}
+
+
+def compile_policy(policy_doc: dict) -> Policy:
+    return Policy(policy_doc.get(FEATURES, {}), policy_doc.get(VERSION, 0))
+
+
+policy = None
+policy_checked = 0
+policy_lock = threading.Lock()
+
+
+def get_policy() -> Policy:
+    """
+    The compiled policy. At most every REFRESH_SECS, one projected read
+    of the policy version tells us whether to reload and recompile it.
+    """
+    global policy, policy_checked, security_recs
+    now = time.monotonic()
+    if policy is not None and now - policy_checked < REFRESH_SECS:
+        return policy
+    with policy_lock:
+        if policy is None:
+            policy = compile_policy(load_policy())
+        elif now - policy_checked >= REFRESH_SECS:
+            doc = dbc.read_one(COLLECT_NAME, {dbc.MONGO_ID: POLICY_ID},
+                               fields=[VERSION])
+            if doc is None or doc[VERSION] != policy.version:
+                policy = compile_policy(load_policy())
+        policy_checked = now
+        security_recs = policy.recs
+    return policy
+
+
+def update_protection(feature_name: str, action: str, protection: dict):
+    """
+    Set how one action on a feature is protected.
+    Every process picks the change up within REFRESH_SECS.
+    """
+    global policy_checked
+    if '.' in feature_name or feature_name.startswith('$'):
+        raise ValueError(f'Bad feature name: {feature_name}')
+    for check in protection.get(CHECKS, {}):
+        if check not in CHECK_FUNCS:
+            raise ValueError(f'Bad check: {check}')
+    load_policy()
+    dbc.update_ops(COLLECT_NAME, {dbc.MONGO_ID: POLICY_ID},
+                   {'$set': {f'{FEATURES}.{feature_name}.{action}':
+                             protection},
+                    '$inc': {VERSION: 1}})
+    policy_checked = 0  # check the version on the next call
+
+
 def is_permitted(feature_name: str, action: str,
                  user_id: str, **kwargs) -> bool:
-    prot = read_feature(feature_name)
-    if prot is None:
-        return True
-    if action not in prot:
+    """
+    One dict lookup for the compiled decision, then a set membership test
+    and the checks. Unprotected features and actions are permitted.
+    """
+    current = policy
+    if current is None or time.monotonic() - policy_checked >= REFRESH_SECS:
+        current = get_policy()
+    decision = current.decisions.get((feature_name, action))
+    if decision is None:
         return True
-    if USER_LIST in prot[action]:
-        if user_id not in prot[action][USER_LIST]:
+    return decision(user_id, **kwargs)
+
+
+# Within one request, the same user may be checked against several
+# features and actions. These keep the user and login key read from the
+# request, and memoize decisions and check results, in flask.g,
+# so nothing is evaluated twice per request.
+USER_ID_HEADER = 'X-User-Id'
+LOGIN_KEY_HEADER = 'X-Login-Key'
+
+
+def with_request_user(fn):
+    """
+    Decorate an endpoint method to read the user and login key
+    from the request once, before it runs.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.sec_user_id = request.headers.get(USER_ID_HEADER)
+        g.sec_login_key = request.headers.get(LOGIN_KEY_HEADER)
+        g.sec_memo = {}
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def get_memo() -> dict:
+    if 'sec_memo' not in g:
+        g.sec_memo = {}
+    return g.sec_memo
+
+
+def inputs_key(kwargs: dict):
+    """
+    A hashable key for check inputs, or None if they aren't hashable:
+    then we just don't memoize.
+    """
+    try:
+        key = tuple(sorted(kwargs.items()))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def memoized(memo: dict, key, compute):
+    if key is None:
+        return compute()
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+def request_permitted(feature_name: str, action: str, **kwargs) -> bool:
+    """
+    is_permitted for the user of the current request
+    (see with_request_user), memoized for the rest of the request
+    on (user, feature, action, check inputs).
+    Each check result is memoized too, so a login or dual factor check
+    runs once per request however many features need it.
+    """
+    user_id = g.get('sec_user_id')
+    login_key = g.get('sec_login_key')
+    if login_key is not None:
+        kwargs.setdefault(LOGIN_KEY, login_key)
+    memo = get_memo()
+    inputs = inputs_key(kwargs)
+
+    def memo_key(*parts):
+        return None if inputs is None else (*parts, inputs)
+
+    def decide() -> bool:
+        rule = get_policy().rules.get((feature_name, action))
+        if rule is None:
+            return True
+        users, checks = rule
+        if users is not None and user_id not in users:
             return False
-    if CHECKS not in prot[action]:
+        for check in checks:
+            if not memoized(memo, memo_key(check, user_id),
+                            lambda: bool(check(user_id, **kwargs))):
+                return False
         return True
-    for check in prot[action][CHECKS]:
-        if check not in CHECK_FUNCS:
-            raise ValueError(f'Bad check passed to is_permitted: {check}')
-        if not CHECK_FUNCS[check](user_id, **kwargs):
-            return False
-    return True
\ No newline at end of file
+
+    return memoized(memo, memo_key(user_id, feature_name, action), decide)
+
+
+def require_permission(feature_name: str, action: str, **kwargs):
+    """
+    Abort the request with 403 unless request_permitted.
+    """
+    if not request_permitted(feature_name, action, **kwargs):
+        abort(HTTPStatus.FORBIDDEN,
+              f'Not permitted: {action} on {feature_name}')
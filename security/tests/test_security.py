@@ -1,17 +1,54 @@
+from unittest.mock import patch
+
+from flask import Flask
 import pytest
+from werkzeug.exceptions import Forbidden
 
 import security.security as sec
+import security.tokens as tkn
+
+TEST_POLICY = {sec.FEATURES: sec.temp_recs, sec.VERSION: 0}
+
+
+@pytest.fixture(autouse=True)
+def local_policy():
+    """
+    Compile the policy from temp_recs rather than the DB.
+    """
+    sec.policy = None
+    with patch('security.security.load_policy', return_value=TEST_POLICY), \
+            patch.object(tkn.revoked, 'start'):
+        yield
+    sec.policy = None
+
 
+@pytest.fixture()
+def good_key():
+    return tkn.issue(sec.GOOD_USER_ID)
 
-def test_check_login_good():
+
+@pytest.fixture()
+def a_key():
+    return tkn.issue('a@nyu.edu')
+
+
+def test_check_login_good(good_key):
     assert sec.check_login(sec.GOOD_USER_ID,
-                           login_key='any key will do for now')
+                           login_key=good_key)
 
 
 def test_check_login_bad():
     assert not sec.check_login(sec.GOOD_USER_ID)
 
 
+def test_check_login_bad_key():
+    assert not sec.check_login(sec.GOOD_USER_ID, login_key='a made up key')
+
+
+def test_check_login_other_users_key(a_key):
+    assert not sec.check_login(sec.GOOD_USER_ID, login_key=a_key)
+
+
 def test_read():
     recs = sec.read()
     assert isinstance(recs, dict)
@@ -42,6 +79,159 @@ def test_is_permitted_bad_check():
         sec.is_permitted(sec.BAD_FEATURE, sec.CREATE, sec.GOOD_USER_ID)
 
 
-def test_is_permitted_all_good():
+def test_is_permitted_all_good(good_key):
     assert sec.is_permitted(sec.PEOPLE, sec.CREATE, sec.GOOD_USER_ID,
-                            login_key='any key for now')
\ No newline at end of file
+                            login_key=good_key)
+
+
+def test_decision_user_set():
+    decide = sec.compile_decision({sec.USER_LIST: ['a@nyu.edu',
+                                                   'b@nyu.edu']})
+    assert decide('a@nyu.edu')
+    assert not decide('c@nyu.edu')
+
+
+def test_decision_no_user_list():
+    assert sec.compile_decision({})('anyone')
+
+
+def test_decision_one_check(a_key):
+    decide = sec.compile_decision({sec.CHECKS: {sec.LOGIN: True}})
+    assert not decide('a@nyu.edu')
+    assert decide('a@nyu.edu', login_key=a_key)
+
+
+def test_decision_many_checks(a_key):
+    decide = sec.compile_decision({
+        sec.USER_LIST: ['a@nyu.edu'],
+        sec.CHECKS: {sec.LOGIN: True, sec.IP_ADDR: True},
+    })
+    assert not decide('a@nyu.edu', login_key=a_key)
+    assert decide('a@nyu.edu', login_key=a_key, ip_address='127.0.0.1')
+    assert not decide('b@nyu.edu', login_key=a_key,
+                      ip_address='127.0.0.1')
+
+
+def test_decision_bad_check():
+    decide = sec.compile_decision({sec.CHECKS: {'no such check': True}})
+    with pytest.raises(ValueError):
+        decide('a@nyu.edu')
+
+
+def test_compile_policy():
+    policy = sec.compile_policy(TEST_POLICY)
+    assert (sec.MANUSCRIPTS, sec.DELETE) in policy.decisions
+    assert (sec.PEOPLE, sec.READ) not in policy.decisions
+
+
+def test_is_permitted_checks_run(good_key):
+    assert not sec.is_permitted(sec.MANUSCRIPTS, sec.READ, sec.GOOD_USER_ID,
+                                login_key=good_key)
+    assert sec.is_permitted(sec.MANUSCRIPTS, sec.READ, sec.GOOD_USER_ID,
+                            login_key=good_key, ip_address='127.0.0.1')
+
+
+def test_policy_reloads_on_version_bump():
+    policy = sec.get_policy()
+    sec.policy_checked = 0
+    new_policy = {sec.FEATURES: {}, sec.VERSION: 1}
+    with patch('data.db_connect.read_one', return_value={sec.VERSION: 1}), \
+            patch('security.security.load_policy', return_value=new_policy):
+        assert sec.get_policy() is not policy
+        assert sec.is_permitted(sec.PEOPLE, sec.CREATE, 'anyone')
+
+
+def test_policy_kept_if_version_unchanged():
+    policy = sec.get_policy()
+    sec.policy_checked = 0
+    with patch('data.db_connect.read_one', return_value={sec.VERSION: 0}):
+        assert sec.get_policy() is policy
+
+
+def test_update_protection_bad_check():
+    with pytest.raises(ValueError):
+        sec.update_protection(sec.PEOPLE, sec.READ,
+                              {sec.CHECKS: {'no such check': True}})
+
+
+TEST_APP = Flask(__name__)
+
+
+@pytest.fixture()
+def login_headers(good_key):
+    return {sec.USER_ID_HEADER: sec.GOOD_USER_ID,
+            sec.LOGIN_KEY_HEADER: good_key}
+
+
+@pytest.fixture()
+def counted_login():
+    """
+    Count the login checks: compiled now, so the policy picks it up.
+    """
+    calls = []
+
+    def check_login(user_id, **kwargs):
+        calls.append(user_id)
+        return sec.check_login(user_id, **kwargs)
+    with patch.dict(sec.CHECK_FUNCS, {sec.LOGIN: check_login}):
+        yield calls
+
+
+def test_request_permitted_login_once(counted_login, login_headers):
+    @sec.with_request_user
+    def endpoint():
+        return [sec.request_permitted(sec.MANUSCRIPTS, sec.CREATE),
+                sec.request_permitted(sec.MANUSCRIPTS, sec.CREATE),
+                sec.request_permitted(sec.PEOPLE, sec.CREATE)]
+    with TEST_APP.test_request_context(headers=login_headers):
+        assert endpoint() == [True, True, True]
+    # three decisions, two of them different, but one login check
+    assert counted_login == [sec.GOOD_USER_ID]
+
+
+def test_request_permitted_memo_per_request(counted_login, login_headers):
+    @sec.with_request_user
+    def endpoint():
+        return sec.request_permitted(sec.MANUSCRIPTS, sec.CREATE)
+    for _ in range(2):
+        with TEST_APP.test_request_context(headers=login_headers):
+            assert endpoint()
+    assert len(counted_login) == 2
+
+
+def test_request_permitted_no_login_key():
+    @sec.with_request_user
+    def endpoint():
+        return sec.request_permitted(sec.MANUSCRIPTS, sec.CREATE)
+    with TEST_APP.test_request_context(headers={
+            sec.USER_ID_HEADER: sec.GOOD_USER_ID}):
+        assert not endpoint()
+
+
+def test_request_permitted_unhashable_inputs(counted_login, login_headers):
+    @sec.with_request_user
+    def endpoint():
+        return [sec.request_permitted(sec.MANUSCRIPTS, sec.CREATE,
+                                      extra=['not', 'hashable'])
+                for _ in range(2)]
+    with TEST_APP.test_request_context(headers=login_headers):
+        assert endpoint() == [True, True]
+    assert len(counted_login) == 2
+
+
+def test_require_permission_forbidden():
+    @sec.with_request_user
+    def endpoint():
+        sec.require_permission(sec.PEOPLE, sec.CREATE)
+    with TEST_APP.test_request_context(headers={
+            sec.USER_ID_HEADER: 'someone else', sec.LOGIN_KEY_HEADER: 'k'}):
+        with pytest.raises(Forbidden):
+            endpoint()
+
+
+def test_policy_compiles_each_rule_once():
+    with patch('security.security.compile_rule',
+               wraps=sec.compile_rule) as counted:
+        policy = sec.Policy(sec.temp_recs)
+    assert counted.call_count == len(policy.rules)
+    assert policy.decisions.keys() == policy.rules.keys()
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+
+import security.tokens as tkn
+
+TEST_EMAIL = 'ejc369@nyu.edu'
+
+
+@pytest.fixture(autouse=True)
+def no_revoked_db():
+    """
+    Keep the revoked cache in memory: no DB here.
+    """
+    with patch.object(tkn.revoked, 'start'), \
+            patch.object(tkn.revoked, 'expires', {}):
+        yield
+
+
+def test_issue_verify():
+    claims = tkn.verify(tkn.issue(TEST_EMAIL, 3, 'ED'))
+    assert claims[tkn.SUB] == TEST_EMAIL
+    assert claims[tkn.LEVEL] == 3
+    assert claims[tkn.ROLE] == 'ED'
+
+
+def test_tokens_differ():
+    assert tkn.issue(TEST_EMAIL) != tkn.issue(TEST_EMAIL)
+
+
+def test_verify_expired():
+    assert tkn.verify(tkn.issue(TEST_EMAIL, ttl=-1)) is None
+
+
+def test_verify_tampered():
+    payload, signature = tkn.issue(TEST_EMAIL, 0).split('.')
+    claims = tkn.decode(f'{payload}.{signature}')
+    claims[tkn.LEVEL] = 9000
+    forged = tkn.b64encode(tkn.json.dumps(claims).encode())
+    assert tkn.verify(f'{forged}.{signature}') is None
+
+
+@pytest.mark.parametrize('token', [
+    None, '', 'no dots', 'too.many.dots', 'bad.signature', 'é.x',
+])
+def test_verify_malformed(token):
+    assert tkn.verify(token) is None
+
+
+def test_verify_other_secret():
+    token = tkn.issue(TEST_EMAIL)
+    with patch.object(tkn, 'secret', b'another secret'):
+        assert tkn.verify(token) is None
+
+
+def test_no_secret(monkeypatch):
+    monkeypatch.delenv(tkn.SECRET_VAR, raising=False)
+    with pytest.raises(ValueError):
+        tkn.issue(TEST_EMAIL)
+
+
+def test_secret_from_env(monkeypatch):
+    monkeypatch.setenv(tkn.SECRET_VAR, 'a shared secret')
+    assert tkn.get_secret() == b'a shared secret'
+
+
+@patch('data.db_connect.insert_one', autospec=True)
+def test_revoke(mock_insert):
+    token = tkn.issue(TEST_EMAIL)
+    assert tkn.revoke(token)
+    assert tkn.verify(token) is None
+    assert not tkn.revoke(token)
+    assert mock_insert.call_count == 1
+
+
+def test_verify_skips_db():
+    callers = []
+
+    def find(*args, **kwargs):
+        callers.append(threading.current_thread())
+        return []
+
+    cache = tkn.RevokedCache(refresh_secs=3600)
+    with patch('data.db_connect.find', side_effect=find), \
+            patch.object(tkn, 'revoked', cache):
+        assert tkn.verify(tkn.issue(TEST_EMAIL)) is not None
+        cache.thread.join(timeout=0.5)  # the refresher loops: just wait
+    # only the refresher reads revocations, never the request itself
+    assert len(callers) == 1
+    assert callers[0] is not threading.current_thread()
+
+
+def test_load_merges():
+    cache = tkn.RevokedCache()
+    now = time.time()
+    cache.add('added meanwhile', now + 60)
+    cache.add('expired', now - 60)
+    recs = [{tkn.TOKEN_ID: 'from another worker',
+             tkn.EXPIRES: datetime.fromtimestamp(now + 60, timezone.utc)
+             .replace(tzinfo=None)}]
+    with patch('data.db_connect.find', autospec=True, return_value=recs):
+        cache.load()
+    assert 'added meanwhile' in cache.expires
+    assert 'from another worker' in cache.expires
+    assert 'expired' not in cache.expires
+
+
+@patch('data.db_connect.find', autospec=True,
+       side_effect=tkn.pm.errors.AutoReconnect('DB is down'))
+def test_load_failure_keeps_revocations(mock_find):
+    cache = tkn.RevokedCache()
+    cache.add('revoked', time.time() + 60)
+    cache.load()
+    assert 'revoked' in cache.expires
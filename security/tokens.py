@@ -0,0 +1,193 @@
+"""
+Signed, expiring session tokens.
+A token carries the user's email, level and role, and is signed with
+HMAC-SHA256, so checking one needs no DB access: just the signature,
+the expiry, and a small in-memory cache of revoked tokens.
+The signing key comes from SESSION_SECRET, which every worker must share.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+import pymongo as pm
+
+import data.db_connect as dbc
+
+SECRET_VAR = 'SESSION_SECRET'
+TOKEN_TTL = 8 * 60 * 60  # seconds
+
+# claims
+SUB = 'sub'  # the user's email
+LEVEL = 'lvl'
+ROLE = 'role'
+EXPIRES = 'exp'
+TOKEN_ID = 'jti'  # what we revoke by
+
+REVOKED_COLLECT = 'revoked_tokens'
+# how often a process picks up other workers' revocations
+REVOKED_REFRESH_SECS = 30
+
+ENCODING = 'utf-8'
+
+
+# read on first use, not at import
+secret = None
+
+
+def get_secret() -> bytes:
+    """
+    The signing key. There is no fallback: a key made up per process
+    would make every other worker, and every restart, reject our tokens.
+    Raises ValueError if SESSION_SECRET is not set.
+    """
+    global secret
+    if secret is None:
+        val = os.environ.get(SECRET_VAR)
+        if not val:
+            raise ValueError(f'You must set {SECRET_VAR} to sign'
+                             + ' session tokens: every worker must share it.')
+        secret = val.encode(ENCODING)
+    return secret
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def sign(payload: str) -> str:
+    return b64encode(hmac.new(get_secret(), payload.encode('ascii'),
+                              hashlib.sha256).digest())
+
+
+def issue(email: str, level: int = 0, role: str = None,
+          ttl: int = TOKEN_TTL) -> str:
+    claims = {
+        SUB: email,
+        LEVEL: level,
+        ROLE: role,
+        EXPIRES: int(time.time()) + ttl,
+        TOKEN_ID: secrets.token_urlsafe(12),
+    }
+    payload = b64encode(json.dumps(claims, separators=(',', ':'))
+                        .encode(ENCODING))
+    return f'{payload}.{sign(payload)}'
+
+
+def decode(token: str) -> dict:
+    """
+    The claims of a correctly signed token, expired or not,
+    or None if the token is malformed or the signature is wrong.
+    """
+    if not isinstance(token, str) or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    try:
+        # compare in constant time, so timing doesn't leak the signature
+        if not hmac.compare_digest(sign(payload), signature):
+            return None
+        return json.loads(b64decode(payload))
+    except (ValueError, UnicodeError):
+        return None
+
+
+class RevokedCache:
+    """
+    The IDs of revoked tokens that haven't expired yet, mapped to when
+    they expire. Our own revocations land at once;
+    other workers' are read every REVOKED_REFRESH_SECS by a background
+    thread, so a lookup never waits on the DB, even when it is down.
+    """
+    def __init__(self, refresh_secs=REVOKED_REFRESH_SECS):
+        self.refresh_secs = refresh_secs
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        """
+        Start the refresher thread, once per process:
+        a forked worker does not inherit its parent's thread.
+        """
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            self.load()
+            time.sleep(self.refresh_secs)
+
+    def load(self):
+        now = datetime.now(timezone.utc)
+        try:
+            recs = dbc.find(REVOKED_COLLECT, {EXPIRES: {'$gt': now}},
+                            fields=[TOKEN_ID, EXPIRES])
+        except pm.errors.PyMongoError as err:
+            # keep what we have and try again later
+            print(f'Revoked token load failed: {err=}')
+            return
+        # Mongo hands back naive datetimes, in UTC
+        loaded = {rec[TOKEN_ID]: rec[EXPIRES].replace(
+            tzinfo=timezone.utc).timestamp() for rec in recs}
+        with self.lock:
+            # merge, don't replace: anything add()ed while we were
+            # querying isn't in recs yet
+            now_secs = now.timestamp()
+            self.expires = {token_id: expires for token_id, expires
+                            in self.expires.items() if expires > now_secs}
+            self.expires.update(loaded)
+
+    def add(self, token_id: str, expires: float):
+        with self.lock:
+            self.expires[token_id] = expires
+
+    def __contains__(self, token_id: str) -> bool:
+        self.start()
+        return token_id in self.expires
+
+
+revoked = RevokedCache()
+
+
+def verify(token: str) -> dict:
+    """
+    The claims of a valid token: correctly signed, not expired,
+    and not revoked. None otherwise.
+    """
+    claims = decode(token)
+    if claims is None or claims.get(EXPIRES, 0) <= time.time():
+        return None
+    if claims.get(TOKEN_ID) in revoked:
+        return None
+    return claims
+
+
+def revoke(token: str) -> bool:
+    """
+    Revoke a token until it expires. Returns False if it wasn't valid.
+    """
+    claims = verify(token)
+    if claims is None:
+        return False
+    revoked.add(claims[TOKEN_ID], claims[EXPIRES])
+    dbc.insert_one(REVOKED_COLLECT, {
+        TOKEN_ID: claims[TOKEN_ID],
+        # a datetime, so a TTL index can drop it once it has expired
+        EXPIRES: datetime.fromtimestamp(claims[EXPIRES], timezone.utc),
+    })
+    return True
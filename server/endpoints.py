@@ -3,16 +3,25 @@ This is the file containing all of the endpoints for our flask app.
 The endpoint called `endpoints` will return all available endpoints.
 """
 from http import HTTPStatus
+import io
+import json
 
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 from flask_restx import Resource, Api, fields  # Namespace, fields
 from flask_cors import CORS
 
+import data.bodies as bds
+import data.db_connect as dbc
 import data.people as ppl
+import data.prefix_index as pidx
+import data.revisions as revs
 import data.text as txt
 import data.manuscripts as manu
 import data.roles as rls
+import data.transitions as trans
 import data.users as usr
+import security.security as sec
+import security.tokens as tkn
 
 
 import werkzeug.exceptions as wz
@@ -38,6 +47,7 @@ DEL_COUNT = 'Deleted Count'
 PUBLISHER = 'Springer'
 PUBLISHER_RESP = 'Publisher'
 RETURN = 'return'
+TOKEN = 'token'
 # Endpoint that returns journal title
 JOURNAL_EP = '/journalTitle'
 JOURNAL_RESP = 'Journal Title'
@@ -45,6 +55,86 @@ TITLE = "SWEtastic-journal"
 TXT_EP = '/text'
 ROLE_EP = '/role'
 ROLES_EP = '/roles'
+# pagination:
+LIMIT = 'limit'
+AFTER = 'after'
+ITEMS = 'items'
+NEXT = 'next'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+PAGE_PARAMS = {
+    LIMIT: f'Page size (max {MAX_PAGE_SIZE})',
+    AFTER: 'The next token from the previous page',
+}
+
+
+def get_page_args():
+    """
+    Returns (limit, after) if the client asked for a page.
+    Returns None if there are no paging args: then we keep returning
+    the whole collection, as we always have.
+    """
+    limit = request.args.get(LIMIT)
+    after = request.args.get(AFTER)
+    if limit is None and after is None:
+        return None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise wz.BadRequest(f'{LIMIT} must be an integer: {limit}')
+    if limit < 1:
+        raise wz.BadRequest(f'{LIMIT} must be positive: {limit}')
+    return min(limit, MAX_PAGE_SIZE), after
+
+
+NDJSON_MIME = 'application/x-ndjson'
+IF_MATCH = 'If-Match'
+ETAG = 'ETag'
+
+
+def get_if_match():
+    """
+    Returns the manuscript version the client sent in If-Match, if any.
+    """
+    val = request.headers.get(IF_MATCH)
+    if val is None:
+        return None
+    try:
+        return int(val.strip().strip('"'))
+    except ValueError:
+        raise wz.BadRequest(f'{IF_MATCH} must be a version number: {val}')
+
+
+def get_actor() -> str:
+    """
+    Who is making the request: the subject of a valid session token,
+    else None. Never X-User-Id: anyone can send that.
+    """
+    claims = tkn.verify(request.headers.get(sec.LOGIN_KEY_HEADER))
+    return None if claims is None else claims[tkn.SUB]
+
+
+def make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def stream_ndjson(recs) -> Response:
+    """
+    Write records as newline-delimited JSON as they come off the cursor,
+    so the first line goes out before the last doc is read.
+    """
+    def generate():
+        for rec in recs:
+            yield json.dumps(rec, default=str) + '\n'
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIME)
+
+
+def read_page(read_fn, limit: int, after: str, **kwargs) -> dict:
+    try:
+        items, next_token = read_fn(limit, after=after, **kwargs)
+    except ValueError as err:
+        raise wz.BadRequest(str(err))
+    return {ITEMS: items, NEXT: next_token}
 
 
 @api.route(HELLO_EP)
@@ -100,6 +190,15 @@ class Roles(Resource):
         return rls.read()
 
 
+@api.route(f'{ROLES_EP}/counts')
+class RoleCounts(Resource):
+    """
+    How many people have each role
+    """
+    def get(self):
+        return rls.get_role_counts()
+
+
 @api.route(f'{ROLES_EP}/<string:code>')
 class FilterRoles(Resource):
     """
@@ -124,13 +223,30 @@ class People(Resource):
     This class handles creating, reading, updating
     and deleting journal people.
     """
+    @api.doc(params=PAGE_PARAMS)
     def get(self):
         """
         Retrieve the journal people.
+        Pass limit and/or after to get one page at a time.
         """
+        page_args = get_page_args()
+        if page_args:
+            return read_page(ppl.read_page, *page_args)
         return ppl.read()
 
 
+@api.route(f'{PEOPLE_EP}/export')
+class PeopleExport(Resource):
+    """
+    Stream all journal people for bulk consumers.
+    """
+    def get(self):
+        """
+        Export every person as newline-delimited JSON.
+        """
+        return stream_ndjson(ppl.stream())
+
+
 PEOPLE_CREATE_FLDS = api.model('AddNewPeopleEntry', {
     ppl.NAME: fields.String,
     ppl.EMAIL: fields.String,
@@ -194,15 +310,13 @@ class PeopleCreate(Resource):
                     + "name, email or affiliation"
                 )
 
-            # check for duplicate person by email
-            if ppl.exists(email):
+            # create new person; None means the email is taken
+            ret = ppl.create(name, affiliation, email, roles)
+            if ret is None:
                 raise ValueError(
                     f"A person with email '{email}' already exists."
                 )
 
-            # create new person
-            ret = ppl.create(name, affiliation, email, roles)
-
         except ValueError as val_err:
             return {'message': str(val_err)}, HTTPStatus.NOT_ACCEPTABLE
         except Exception as err:
@@ -270,11 +384,6 @@ class PeopleNameUpdate(Resource):
 @api.route(f'{PEOPLE_EP}/<string:email>/addRole/<string:role>')
 class AddRole(Resource):
     def put(self, email, role):
-        try:
-            person = ppl.read_one(email)
-        except ValueError:
-            mssg = f"{person} not found, please create the person first"
-            return {"message": mssg}, 404
         try:
             ppl.add_role(email, role)
         except KeyError as err:
@@ -287,15 +396,12 @@ class AddRole(Resource):
 @api.route(f'{PEOPLE_EP}/<string:email>/removeRole/<string:role>')
 class RemoveRole(Resource):
     def delete(self, email, role):
-        try:
-            person = ppl.read_one(email)
-        except ValueError:
-            mssg = f"{person} not found"
-            return {"message": mssg}, 404
         try:
             ppl.remove_role(email, role)
-        except KeyError:
-            return {"message": f"{role} doesn't exist"}, 404
+        except KeyError as err:
+            return {"message": str(err)}, 404
+        except ValueError as err:
+            return {"message": str(err)}, 400
         return {"message": f"Role '{role}' removed from {email}"}, 200
 
 
@@ -383,6 +489,15 @@ class Masthead(Resource):
         return {MASTHEAD: ppl.get_masthead()}
 
 
+@api.route(f'{PEOPLE_EP}/masthead/cache')
+class MastheadCacheStats(Resource):
+    """
+    Hit and miss counters for the masthead cache.
+    """
+    def get(self):
+        return ppl.get_masthead_cache_stats()
+
+
 # Define model for creating a new Manuscript entry
 MANU_CREATE_FLDS = api.model('CreateNewManuscriptEntry', {
     manu.TITLE: fields.String(
@@ -422,17 +537,60 @@ class Manuscripts(Resource):
     """
     This class handles retrieving all manuscripts.
     """
+    @api.doc(params=PAGE_PARAMS)
     def get(self):
         """
         Retrieve all manuscripts.
+        Pass limit and/or after to get one page at a time.
         """
-        manuscripts = manu.read()
+        page_args = get_page_args()
+        if page_args:
+            return read_page(manu.read_page, *page_args,
+                             fields=manu.SUMMARY_FIELDS), 200
+        manuscripts = manu.read(fields=manu.SUMMARY_FIELDS)
         if manuscripts is None:
             raise wz.NotFound("Could not retrieve manuscripts from database")
         else:
             return manuscripts, 200
 
 
+@api.route(f'{MANU_EP}/export')
+class ManuscriptsExport(Resource):
+    """
+    Stream all manuscripts for bulk consumers.
+    """
+    def get(self):
+        """
+        Export every manuscript as newline-delimited JSON.
+        """
+        return stream_ndjson(manu.stream())
+
+
+@api.route(f'{MANU_EP}/counts')
+class ManuscriptStateCounts(Resource):
+    """
+    Number of manuscripts in each state, for the editors' dashboard.
+    """
+    @api.doc(params={manu.REFEREE: 'Only count this referee\'s manuscripts',
+                     manu.AUTHOR_EMAIL: 'Only count this author\'s'})
+    def get(self):
+        return manu.get_state_counts(
+            referee=request.args.get(manu.REFEREE),
+            author_email=request.args.get(manu.AUTHOR_EMAIL))
+
+
+@api.route(f'{MANU_EP}/typeahead')
+class ManuscriptTypeahead(Resource):
+    """
+    Type-ahead suggestions for manuscript titles and authors.
+    """
+    @api.doc(params={'prefix': 'What the user has typed so far',
+                     LIMIT: 'How many titles to return'})
+    def get(self):
+        prefix = request.args.get('prefix', '')
+        return manu.typeahead(prefix, get_limit(pidx.DEFAULT_LIMIT))
+
+
 @api.route(f"{MANU_EP}/ValidActions")
 class ManuscriptsValidActions(Resource):
     """
@@ -492,11 +650,213 @@ class ManuscriptReadOne(Resource):
         """
         manuscript = manu.read_one(title)
         if manuscript:
-            return manuscript
+            version = manuscript.get(manu.VERSION, 0)
+            return manuscript, 200, {ETAG: make_etag(version)}
         else:
             raise wz.NotFound(f'No manuscript found with title: {title}')
 
 
+def get_limit(default: int) -> int:
+    try:
+        limit = int(request.args.get(LIMIT, default))
+    except ValueError:
+        raise wz.BadRequest(f'{LIMIT} must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+@api.route(f'{MANU_EP}/referee/<string:email>')
+class RefereeManuscripts(Resource):
+    """
+    A referee's active manuscripts, with counts per state.
+    """
+    def get(self, email):
+        return manu.get_referee_manuscripts(email)
+
+
+@api.route(f'{MANU_EP}/<string:title>/recommend_referees')
+class RecommendReferees(Resource):
+    """
+    Referees whose past manuscripts are most like this one.
+    """
+    @api.doc(params={LIMIT: 'How many referees to return'})
+    @api.response(HTTPStatus.OK, 'Success')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript')
+    def get(self, title):
+        try:
+            return manu.recommend_referees(
+                title, get_limit(manu.RECOMMEND_LIMIT))
+        except ValueError as err:
+            raise wz.NotFound(str(err))
+
+
+@api.route(f'{MANU_EP}/<string:title>/history')
+class ManuscriptHistory(Resource):
+    """
+    The most recent state transitions of one manuscript.
+    """
+    @api.doc(params={LIMIT: 'How many transitions to return'})
+    def get(self, title):
+        manuscript = manu.read_one(title, fields=[manu.MANU_ID])
+        if not manuscript:
+            raise wz.NotFound(f'No manuscript found with title: {title}')
+        manu_id = manu.to_manu_id(manuscript[manu.MANU_ID])
+        return trans.recent_for_manuscript(
+            manu_id, get_limit(trans.DEFAULT_LIMIT))
+
+
+@api.route(f'{MANU_EP}/transitions/<string:state>')
+class StateTransitions(Resource):
+    """
+    The most recent transitions into a state, across all manuscripts.
+    """
+    @api.doc(params={LIMIT: 'How many transitions to return'})
+    def get(self, state):
+        if not manu.is_valid_state(state):
+            raise wz.NotFound(f'No such state: {state}')
+        return trans.recent_for_state(state, get_limit(trans.DEFAULT_LIMIT))
+
+
+def send_body(body, length: int, content_type: str) -> Response:
+    """
+    Stream a body a chunk at a time, honouring a single Range header,
+    so a client can fetch part of a large file or resume a download.
+    """
+    start, stop = 0, length
+    status = HTTPStatus.OK
+    headers = {'Accept-Ranges': 'bytes'}
+    if request.range is not None:
+        span = request.range.range_for_length(length)
+        if span is None:
+            body.close()
+            raise wz.RequestedRangeNotSatisfiable(length=length)
+        start, stop = span
+        status = HTTPStatus.PARTIAL_CONTENT
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+    headers['Content-Length'] = str(stop - start)
+
+    def generate():
+        with body:
+            body.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = body.read(min(bds.CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    return Response(generate(), status=status, headers=headers,
+                    content_type=content_type)
+
+
+def get_manu_id(title: str) -> str:
+    manuscript = manu.read_one(title, fields=[manu.MANU_ID])
+    if not manuscript:
+        raise wz.NotFound(f'No manuscript found with title: {title}')
+    return manuscript[manu.MANU_ID]
+
+
+@api.route(f'{MANU_EP}/<string:title>/bodies')
+class ManuscriptBodies(Resource):
+    """
+    The bodies (text and attachments) stored for a manuscript.
+    """
+    def get(self, title):
+        return bds.list_bodies(get_manu_id(title))
+
+
+@api.route(f'{MANU_EP}/<string:title>/bodies/<string:name>')
+class ManuscriptBody(Resource):
+    """
+    Upload or download one manuscript body, streamed in chunks.
+    """
+    @api.response(HTTPStatus.OK, 'Success')
+    @api.response(HTTPStatus.PARTIAL_CONTENT, 'Part of the body (Range)')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript or body')
+    def get(self, title, name):
+        manuscript = manu.read_one(title, fields=[manu.MANU_ID, manu.TEXT])
+        if not manuscript:
+            raise wz.NotFound(f'No manuscript found with title: {title}')
+        body = bds.open_body(manuscript[manu.MANU_ID], name)
+        if body is not None:
+            return send_body(body, body.length,
+                             body.metadata.get(bds.CONTENT_TYPE,
+                                               bds.DEFAULT_TYPE))
+        # manuscripts from before GridFS keep their text inline
+        if name == bds.TEXT_NAME and manuscript.get(manu.TEXT):
+            text = manuscript[manu.TEXT].encode(bds.ENCODING)
+            return send_body(io.BytesIO(text), len(text), bds.TEXT_TYPE)
+        raise wz.NotFound(f'No {name} stored for: {title}')
+
+    @api.response(HTTPStatus.OK, 'Success')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript')
+    @api.response(HTTPStatus.CONFLICT, 'Another writer saved the text first')
+    def put(self, title, name):
+        """
+        The request body is read from the socket a chunk at a time,
+        never held whole in memory.
+        """
+        if name == bds.TEXT_NAME:
+            # the text is versioned: it goes through the revision history
+            try:
+                rev = manu.update_text(title,
+                                       request.get_data(as_text=True))
+            except manu.ConflictError as err:
+                raise wz.Conflict(str(err))
+            except ValueError as err:
+                raise wz.NotFound(str(err))
+            return {
+                MESSAGE: f'Stored revision {rev} of the text of: {title}',
+                RETURN: rev,
+            }
+        manu_id = get_manu_id(title)
+        content_type = request.content_type or bds.DEFAULT_TYPE
+        file_id = bds.save(manu_id, name, request.stream, content_type)
+        return {
+            MESSAGE: f'Stored {name} for: {title}',
+            RETURN: str(file_id),
+        }
+
+
+@api.route(f'{MANU_EP}/<string:title>/revisions')
+class ManuscriptRevisions(Resource):
+    """
+    The revision history of a manuscript's text.
+    """
+    def get(self, title):
+        return revs.list_revisions(get_manu_id(title))
+
+
+@api.route(f'{MANU_EP}/<string:title>/revisions/<int:rev>')
+class ManuscriptRevision(Resource):
+    """
+    The text of a manuscript as of one revision.
+    """
+    @api.response(HTTPStatus.OK, 'Success')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript or revision')
+    def get(self, title, rev):
+        try:
+            text = revs.get_revision(get_manu_id(title), rev)
+        except KeyError as err:
+            raise wz.NotFound(str(err))
+        return {revs.REV: rev, manu.TEXT: text}
+
+
+@api.route(f'{MANU_EP}/<string:title>/revisions/<int:from_rev>'
+           + '/diff/<int:to_rev>')
+class ManuscriptRevisionDiff(Resource):
+    """
+    A unified diff between two revisions of a manuscript's text.
+    """
+    @api.response(HTTPStatus.OK, 'Success')
+    @api.response(HTTPStatus.NOT_FOUND, 'No such manuscript or revision')
+    def get(self, title, from_rev, to_rev):
+        try:
+            diff = revs.diff(get_manu_id(title), from_rev, to_rev)
+        except KeyError as err:
+            raise wz.NotFound(str(err))
+        return Response(diff, mimetype='text/x-diff')
+
+
 @api.route(f'{MANU_EP}/create')
 class ManuscriptCreate(Resource):
     """
@@ -529,13 +889,12 @@ class ManuscriptCreate(Resource):
                     "Missing required fields: abstract"
                 )
 
-            # check for duplicate person by title
-            if manu.exists(title):
+            # create new title; None means the title is taken
+            ret = manu.create(title, author_email, abstract, text)
+            if ret is None:
                 raise ValueError(
                     f"A manuscript with title '{title}' already exists."
                 )
-            # create new title
-            ret = manu.create(title, author_email, abstract, text)
 
         except ValueError as val_err:
             return {'message': str(val_err)}, HTTPStatus.NOT_ACCEPTABLE
@@ -553,14 +912,11 @@ class ManuscriptCreate(Resource):
 class ManuscriptDelete(Resource):
     def delete(self, title):
         try:
-            # retrieve manuscript by title
-            manu_obj = manu.read_one(title)
-            if not manu_obj:
+            # delete the manuscript by title
+            result = manu.delete(title)
+            if not result.startswith("Deleted"):
                 return {"message": f"Manuscript with title '{title}'" +
                         "not found"}, 404
-
-            # delete the manuscript
-            manu.delete(title)  # delete by title
             return {"message": f"Manuscript '{title}'" +
                     "successfully deleted"}, 200
 
@@ -578,18 +934,16 @@ class ManuscriptUpdateState(Resource):
     """
     def put(self, title, new_state):
         try:
-            # retrieve manuscript by title
-            manu_obj = manu.read_one(title)
-            if not manu_obj:
-                return {"message": f"Manuscript with title '{title}'" +
-                        "not found"}, 404
             # verify valid state
             if not manu.is_valid_state(new_state):
                 return {"message": f"Manuscript: '{title}'" +
                         "attempted to change to invalid state"}, 404
 
             # update the manuscript
-            manu.update_manuscript_state(title, new_state)
+            result = manu.update_manuscript_state(title, new_state)
+            if result.startswith("No manuscript found"):
+                return {"message": f"Manuscript with title '{title}'" +
+                        "not found"}, 404
             return {"message": f"Manuscript '{title}'" +
                     "state successfully updated"}, 200
 
@@ -615,7 +969,11 @@ class ReceiveAction(Resource):
     def put(self):
         """
         Receive an action for a manuscript.
+        Send the manuscript's ETag as If-Match to act only on that version.
         """
+        if_match = get_if_match()
+        # outside the try: a server error here is not a bad action
+        actor = get_actor()
         try:
             print(request.json)
             title = request.json.get(manu.TITLE)
@@ -625,20 +983,28 @@ class ReceiveAction(Resource):
             if action in ['ARF', 'DRF']:
                 if not referee:
                     raise wz.NotAcceptable(f'Referee is required {action}')
-                valid_ref = rls.get_emails_with_role('RE')
-                if referee not in valid_ref:
-                    print(f"valid ref{valid_ref}")
+                if not rls.is_referee(referee):
                     raise wz.NotAcceptable(f'Invalid referee email: {referee}')
             else:
                 referee = None
-            manuscript = manu.read_one(title)
+            manuscript = manu.read_one(title, fields=[manu.CURR_STATE,
+                                                      manu.VERSION])
             if not manuscript:
                 raise wz.NotFound(f"No manuscript found with title: {title}")
 
             manu_id = manuscript['_id']
             curr_state = manuscript[manu.CURR_STATE]
-            kwargs = {manu.REFEREE: referee}
-            ret = manu.handle_action(manu_id, curr_state, action, **kwargs)
+            version = manuscript.get(manu.VERSION, 0)
+            if if_match is not None:
+                version = if_match
+            kwargs = {manu.REFEREE: referee, manu.ACTOR: actor}
+            ret = manu.handle_action(manu_id, curr_state, action,
+                                     version=version, **kwargs)
+        except manu.ConflictError as err:
+            # the manuscript changed since it was read: the client retries
+            if if_match is not None:
+                raise wz.PreconditionFailed(str(err))
+            raise wz.Conflict(str(err))
         except ValueError as err:
             raise wz.NotAcceptable(f"Invalid value: {err}")
         except wz.NotAcceptable as err:
@@ -651,7 +1017,7 @@ class ReceiveAction(Resource):
         return {
             MESSAGE: 'Action received!',
             RETURN: ret,
-        }
+        }, 200, {ETAG: make_etag(version + 1)}
 
 
 @api.route(f'{MANU_EP}/search')
@@ -662,24 +1028,26 @@ class SearchManuscripts(Resource):
     @api.response(HTTPStatus.OK, 'Success')
     @api.response(HTTPStatus.BAD_REQUEST, 'Query parameter is required')
     @api.response(HTTPStatus.INTERNAL_SERVER_ERROR, 'Internal Server Error')
+    @api.doc(params={'query': 'Words to look for',
+                     LIMIT: 'How many results to return'})
     def get(self):
         """
-        Search for manuscripts based on a query.
+        Search for manuscripts based on a query, best matches first.
         """
         query = request.args.get("query", "").strip()
 
         if not query:
-            return {'error': 'Query parameter is required'},
-        HTTPStatus.BAD_REQUEST
+            return ({'error': 'Query parameter is required'},
+                    HTTPStatus.BAD_REQUEST)
 
+        limit = get_limit(manu.SEARCH_LIMIT)
         try:
-            print(f"Received search query: {query}")  # Debugging log
-            results = manu.search_manuscripts(query)
+            results = manu.search_manuscripts(query, limit)
             return results, HTTPStatus.OK
         except Exception as err:
             print(f"Search error: {err}")
-            return {'error': f'Internal Server Error: {str(err)}'},
-        HTTPStatus.INTERNAL_SERVER_ERROR
+            return ({'error': f'Internal Server Error: {str(err)}'},
+                    HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
 @api.route(f'{MANU_EP}/<string:title>/add_referee')
@@ -705,7 +1073,8 @@ class ManuscriptAddReferee(Resource):
                         f"Manuscript with title '{title}' not found."}, 404
 
             # Add the referee to the manuscript subject to change
-            manu.assign_ref(title, referee)
+            manu.assign_ref(manuscript[manu.MANU_ID], referee,
+                            actor=get_actor())
             return {
                 "message":
                     f"Referee '{referee}' added to manuscript '{title}'.",
@@ -737,7 +1106,8 @@ class ManuscriptDeleteReferee(Resource):
                 return {"message":
                         f"Manuscript with title '{title}' not found."}, 404
             # Delete referee from the manuscript subject to change
-            manu.delete_ref(title, referee)
+            manu.delete_ref(manuscript[manu.MANU_ID], referee,
+                            actor=get_actor())
             return {
                 "message":
                     f"Referee '{referee}' deleted from manuscript '{title}'.",
@@ -773,9 +1143,8 @@ class Register(Resource):
 
         try:
             user = usr.create_user(email, name, password, role)
-
-            if not ppl.exists(email):
-                ppl.create(name, "Not specified", email, role)
+            # create() skips people who already exist
+            ppl.create(name, "Not specified", email, role)
 
         except ValueError as ve:
             return {"message": str(ve)}, 400
@@ -802,22 +1171,45 @@ class Login(Resource):
         email = data.get("email")
         password = data.get("password")
 
-        if usr.authenticate(email, password):
-            user = usr.read_one(email)
+        user = usr.login(email, password)
+        if user:
+            level = user.get(usr.LEVEL) or 0
+            role = user.get(usr.role) or "AU"
             return {
                 "message": f"Welcome back, {user[usr.NAME]}!",
                 "name": user[usr.NAME],
-                "level": user.get(usr.LEVEL, 0),
-                "role": user.get("role", "AU")
+                "level": level,
+                "role": role,
+                # send back as the X-Login-Key header
+                TOKEN: tkn.issue(email, level, role),
             }, 200
         else:
             return {"message": "Invalid credentials."}, 401
 
 
+@api.route('/logout')
+class Logout(Resource):
+    def post(self):
+        """
+        Revoke the session token sent as the X-Login-Key header.
+        """
+        if not tkn.revoke(request.headers.get(sec.LOGIN_KEY_HEADER)):
+            return {"message": "Invalid or expired token."}, 401
+        return {"message": "Logged out."}, 200
+
+
 @api.route('/users')
 class AllUsers(Resource):
+    @api.doc(params=PAGE_PARAMS)
     def get(self):
-        users = usr.read_all()
+        page_args = get_page_args()
+        next_token = None
+        if page_args:
+            page = read_page(usr.read_page, *page_args,
+                             fields=usr.PUBLIC_FIELDS)
+            users, next_token = page[ITEMS], page[NEXT]
+        else:
+            users = usr.read_all(fields=usr.PUBLIC_FIELDS)
         sanitized_users = {
             email: {
                 usr.NAME: user.get(usr.NAME),
@@ -826,7 +1218,8 @@ class AllUsers(Resource):
             }
             for email, user in users.items()
         }
-
+        if page_args:
+            return {"users": sanitized_users, NEXT: next_token}, 200
         return {"users": sanitized_users}, 200
 
 
@@ -850,12 +1243,21 @@ class DebugErrorLog(Resource):
             return {'message': f'Error reading log: {str(e)}'}, 500
 
 
+@api.route('/debug/db-pool')
+class DebugDbPool(Resource):
+    """
+    Developer-only: Mongo connection pool utilization
+    """
+    def get(self):
+        return dbc.get_pool_stats(), 200
+
+
 @api.route('/debug/system-info')
 class DebugSystemInfo(Resource):
     def get(self):
         try:
             roles = rls.read()
-            users = usr.read_all()
+            users = usr.read_all(fields=[usr.EMAIL])
             return {
                 "total_users": len(users),
                 "roles_defined": list(roles.keys()),
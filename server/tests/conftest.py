@@ -0,0 +1,14 @@
+import pytest
+
+import security.tokens as tkn
+
+TEST_SECRET = 'a secret for the tests only'
+
+
+@pytest.fixture(autouse=True)
+def session_secret(monkeypatch):
+    """
+    Sign session tokens with a fixed test secret.
+    """
+    monkeypatch.setenv(tkn.SECRET_VAR, TEST_SECRET)
+    monkeypatch.setattr(tkn, 'secret', None)
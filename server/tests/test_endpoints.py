@@ -1,22 +1,37 @@
 from http.client import (
     BAD_REQUEST,
+    CONFLICT,
     FORBIDDEN,
     NOT_ACCEPTABLE,
     NOT_FOUND,
     OK,
+    PARTIAL_CONTENT,
+    PRECONDITION_FAILED,
     SERVICE_UNAVAILABLE,
+    UNAUTHORIZED,
 )
 
+import io
+import json
+
 from unittest.mock import patch
 
 import pytest
 
 from data.people import NAME
 
+import data.bodies as bds
+
 import data.people as ppl
 
 import data.manuscripts as manu
 
+import data.users as usr
+
+import security.security as sec
+
+import security.tokens as tkn
+
 import server.endpoints as ep
 
 TEST_CLIENT = ep.app.test_client()
@@ -309,8 +324,8 @@ def test_addreferee(mock_person):
         "roles": ["RE"] 
     })
     
-    # Patch the function to return a list with the referee
-    with patch('data.roles.get_emails_with_role', return_value=[test_referee]):
+    # Patch the referee check to accept the referee
+    with patch('data.roles.is_referee', return_value=True):
         # Add referee using handle_action
         add_referee_resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
             manu.TITLE: test_title,
@@ -350,8 +365,8 @@ def test_remove_referee(mock_person):
         "roles": ["RE"] 
     })
     
-    # Patch the function to return a list with the referee
-    with patch('data.roles.get_emails_with_role', return_value=[test_referee]):
+    # Patch the referee check to accept the referee
+    with patch('data.roles.is_referee', return_value=True):
         # Add referee using handle_action
         add_referee_resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
             manu.TITLE: test_title,
@@ -361,7 +376,7 @@ def test_remove_referee(mock_person):
         
     assert add_referee_resp.status_code == OK, f"Failed to add referee, got {add_referee_resp.status_code}"
     
-    with patch('data.roles.get_emails_with_role', return_value=[test_referee]):
+    with patch('data.roles.is_referee', return_value=True):
         remove_referee_resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
             manu.TITLE: test_title,
             manu.ACTION: "DRF",
@@ -372,4 +387,290 @@ def test_remove_referee(mock_person):
     # Clean up
     delete_resp = TEST_CLIENT.delete(f"{ep.MANU_EP}/{test_title}/delete")
     assert delete_resp.status_code == OK
-    TEST_CLIENT.delete(f"{ep.PEOPLE_EP}/{test_referee}/delete") 
\ No newline at end of file
+    TEST_CLIENT.delete(f"{ep.PEOPLE_EP}/{test_referee}/delete") 
+
+
+@patch('data.people.read_page', autospec=True, return_value=(
+    {'sample_id': {NAME: 'Alice Example'}}, 'next-token'))
+def test_read_people_page(mock_read_page):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}?{ep.LIMIT}=1')
+    assert resp.status_code == OK
+    resp_json = resp.get_json()
+    assert resp_json[ep.NEXT] == 'next-token'
+    assert 'sample_id' in resp_json[ep.ITEMS]
+    mock_read_page.assert_called_once_with(1, after=None)
+
+
+def test_read_people_bad_limit():
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}?{ep.LIMIT}=zero')
+    assert resp.status_code == BAD_REQUEST
+
+
+@patch('data.people.read_page', autospec=True,
+       side_effect=ValueError('Bad page token'))
+def test_read_people_bad_token(mock_read_page):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}?{ep.AFTER}=garbage')
+    assert resp.status_code == BAD_REQUEST
+
+
+@patch('data.people.stream', autospec=True, return_value=iter([
+    {NAME: 'Alice Example'},
+    {NAME: 'Bob Test'},
+]))
+def test_export_people(mock_stream):
+    resp = TEST_CLIENT.get(f'{ep.PEOPLE_EP}/export')
+    assert resp.status_code == OK
+    assert resp.mimetype == ep.NDJSON_MIME
+    lines = resp.get_data(as_text=True).splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])[NAME] == 'Alice Example'
+
+
+CONFLICT_MANU = {
+    manu.MANU_ID: 'some id',
+    manu.CURR_STATE: manu.SUBMITTED,
+    manu.VERSION: 3,
+}
+
+
+@patch('data.manuscripts.handle_action', autospec=True,
+       side_effect=manu.ConflictError('Manuscript is in REJ, not SUB'))
+@patch('data.manuscripts.read_one', autospec=True, return_value=CONFLICT_MANU)
+def test_receive_action_conflict(mock_read_one, mock_handle_action):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.REJECT,
+    })
+    assert resp.status_code == CONFLICT
+
+
+@patch('data.manuscripts.handle_action', autospec=True,
+       side_effect=manu.ConflictError('Manuscript is at version 4, not 3'))
+@patch('data.manuscripts.read_one', autospec=True, return_value=CONFLICT_MANU)
+def test_receive_action_if_match_stale(mock_read_one, mock_handle_action):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.REJECT,
+    }, headers={ep.IF_MATCH: '"3"'})
+    assert resp.status_code == PRECONDITION_FAILED
+    assert mock_handle_action.call_args.kwargs['version'] == 3
+
+
+@patch('data.manuscripts.handle_action', autospec=True,
+       return_value=manu.REJECTED)
+@patch('data.manuscripts.read_one', autospec=True, return_value=CONFLICT_MANU)
+def test_receive_action_etag(mock_read_one, mock_handle_action):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.REJECT,
+    })
+    assert resp.status_code == OK
+    assert resp.headers[ep.ETAG] == ep.make_etag(4)
+
+
+@patch('data.manuscripts.handle_action', autospec=True,
+       return_value=manu.REJECTED)
+@patch('data.manuscripts.read_one', autospec=True, return_value=CONFLICT_MANU)
+def test_receive_action_actor_not_from_header(mock_read_one,
+                                              mock_handle_action):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.REJECT,
+    }, headers={sec.USER_ID_HEADER: 'editor@nyu.edu'})
+    assert resp.status_code == OK
+    # unauthenticated: we don't record whoever the client claims to be
+    assert mock_handle_action.call_args.kwargs[manu.ACTOR] is None
+
+
+@patch('security.tokens.revoked', set())
+@patch('data.manuscripts.handle_action', autospec=True,
+       return_value=manu.REJECTED)
+@patch('data.manuscripts.read_one', autospec=True, return_value=CONFLICT_MANU)
+def test_receive_action_actor_from_token(mock_read_one, mock_handle_action):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.REJECT,
+    }, headers={sec.LOGIN_KEY_HEADER: tkn.issue('editor@nyu.edu'),
+                sec.USER_ID_HEADER: 'someone.else@nyu.edu'})
+    assert resp.status_code == OK
+    assert mock_handle_action.call_args.kwargs[manu.ACTOR] == 'editor@nyu.edu'
+
+
+@patch('data.manuscripts.get_state_counts', autospec=True,
+       return_value={manu.SUBMITTED: 2})
+def test_get_state_counts(mock_counts):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/counts?{manu.REFEREE}=x@nyu.edu')
+    assert resp.status_code == OK
+    assert resp.get_json() == {manu.SUBMITTED: 2}
+    mock_counts.assert_called_once_with(referee='x@nyu.edu',
+                                        author_email=None)
+
+
+@patch('data.manuscripts.get_state_counts', autospec=True,
+       return_value={manu.SUBMITTED: 1})
+def test_get_state_counts_by_author_email(mock_counts):
+    resp = TEST_CLIENT.get(
+        f'{ep.MANU_EP}/counts?{manu.AUTHOR_EMAIL}=a@nyu.edu')
+    assert resp.status_code == OK
+    mock_counts.assert_called_once_with(referee=None,
+                                        author_email='a@nyu.edu')
+
+
+BODY_TEXT = b'0123456789' * 100
+
+
+class FakeBody(io.BytesIO):
+    length = len(BODY_TEXT)
+    metadata = {bds.CONTENT_TYPE: bds.TEXT_TYPE}
+
+
+@patch('data.bodies.open_body', autospec=True,
+       side_effect=lambda manu_id, name: FakeBody(BODY_TEXT))
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_get_body(mock_read_one, mock_open_body):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/Some Title/bodies/text')
+    assert resp.status_code == OK
+    assert resp.data == BODY_TEXT
+    assert resp.headers['Accept-Ranges'] == 'bytes'
+
+
+@patch('data.bodies.open_body', autospec=True,
+       side_effect=lambda manu_id, name: FakeBody(BODY_TEXT))
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_get_body_range(mock_read_one, mock_open_body):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/Some Title/bodies/text',
+                           headers={'Range': 'bytes=10-19'})
+    assert resp.status_code == PARTIAL_CONTENT
+    assert resp.data == BODY_TEXT[10:20]
+    assert resp.headers['Content-Range'] == f'bytes 10-19/{len(BODY_TEXT)}'
+
+
+@patch('data.bodies.open_body', autospec=True, return_value=None)
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id', manu.TEXT: 'Inline text'})
+def test_get_body_legacy_inline(mock_read_one, mock_open_body):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/Some Title/bodies/text')
+    assert resp.status_code == OK
+    assert resp.data == b'Inline text'
+
+
+@patch('data.bodies.open_body', autospec=True, return_value=None)
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_get_body_missing(mock_read_one, mock_open_body):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/Some Title/bodies/figure.png')
+    assert resp.status_code == NOT_FOUND
+
+
+@patch('data.bodies.save', autospec=True, return_value='file id')
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_put_body(mock_read_one, mock_save):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/Some Title/bodies/figure.png',
+                           data=b'\x89PNG', content_type='image/png')
+    assert resp.status_code == OK
+    manu_id, name, stream, content_type = mock_save.call_args.args
+    assert (manu_id, name, content_type) == ('some id', 'figure.png',
+                                             'image/png')
+
+
+@patch('data.manuscripts.update_text', autospec=True, return_value=3)
+def test_put_body_text_is_revised(mock_update_text):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/Some Title/bodies/text',
+                           data='New text', content_type='text/plain')
+    assert resp.status_code == OK
+    assert resp.get_json()[ep.RETURN] == 3
+    mock_update_text.assert_called_once_with('Some Title', 'New text')
+
+
+@patch('data.manuscripts.update_text', autospec=True,
+       side_effect=manu.ConflictError('Revision 3 was saved first'))
+def test_put_body_text_conflict(mock_update_text):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/Some Title/bodies/text',
+                           data='New text', content_type='text/plain')
+    assert resp.status_code == CONFLICT
+
+
+@patch('data.manuscripts.update_text', autospec=True,
+       side_effect=ValueError('No manuscript found'))
+def test_put_body_text_missing(mock_update_text):
+    resp = TEST_CLIENT.put(f'{ep.MANU_EP}/Some Title/bodies/text',
+                           data='New text', content_type='text/plain')
+    assert resp.status_code == NOT_FOUND
+
+
+@patch('data.revisions.get_revision', autospec=True,
+       side_effect=KeyError('No revision 9'))
+@patch('data.manuscripts.read_one', autospec=True,
+       return_value={manu.MANU_ID: 'some id'})
+def test_get_revision_missing(mock_read_one, mock_get_revision):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/Some Title/revisions/9')
+    assert resp.status_code == NOT_FOUND
+
+
+@patch('data.manuscripts.get_referee_manuscripts', autospec=True,
+       return_value={manu.MANUSCRIPTS: [], manu.COUNTS: {manu.SUBMITTED: 0}})
+def test_get_referee_manuscripts(mock_get):
+    resp = TEST_CLIENT.get(f'{ep.MANU_EP}/referee/ref@nyu.edu')
+    assert resp.status_code == OK
+    assert resp.get_json()[manu.COUNTS] == {manu.SUBMITTED: 0}
+    mock_get.assert_called_once_with('ref@nyu.edu')
+
+
+@patch('data.roles.is_referee', autospec=True, return_value=False)
+def test_receive_action_not_referee(mock_is_referee):
+    resp = TEST_CLIENT.put(f"{ep.MANU_EP}/receive_action", json={
+        manu.TITLE: 'Some Title',
+        manu.ACTION: manu.ASSIGN_REF,
+        manu.REFEREE: 'not_a_referee@nyu.edu',
+    })
+    assert resp.status_code == NOT_ACCEPTABLE
+    mock_is_referee.assert_called_once_with('not_a_referee@nyu.edu')
+
+
+@patch('data.roles.get_role_counts', autospec=True,
+       return_value={'AU': 2, 'RE': 0})
+def test_get_role_counts(mock_counts):
+    resp = TEST_CLIENT.get(f'{ep.ROLES_EP}/counts')
+    assert resp.status_code == OK
+    assert resp.get_json() == {'AU': 2, 'RE': 0}
+
+
+LOGIN_USER = {usr.EMAIL: 'ejc369@nyu.edu', usr.NAME: 'Eugene',
+              usr.LEVEL: 2, usr.role: 'ed'}
+
+
+@patch('data.users.login', autospec=True, return_value=LOGIN_USER)
+def test_login_issues_token(mock_login):
+    resp = TEST_CLIENT.post('/login', json={'email': 'ejc369@nyu.edu',
+                                            'password': 'a password'})
+    assert resp.status_code == OK
+    with patch.object(tkn.revoked, 'start'):
+        claims = tkn.verify(resp.get_json()[ep.TOKEN])
+    assert claims[tkn.SUB] == 'ejc369@nyu.edu'
+    assert claims[tkn.LEVEL] == 2
+    mock_login.assert_called_once_with('ejc369@nyu.edu', 'a password')
+
+
+@patch('data.users.login', autospec=True, return_value=None)
+def test_login_bad_password(mock_login):
+    resp = TEST_CLIENT.post('/login', json={'email': 'ejc369@nyu.edu',
+                                            'password': 'wrong'})
+    assert resp.status_code == UNAUTHORIZED
+    assert ep.TOKEN not in resp.get_json()
+
+
+@patch('data.db_connect.insert_one', autospec=True)
+def test_logout(mock_insert):
+    token = tkn.issue('ejc369@nyu.edu')
+    with patch.object(tkn.revoked, 'start'), \
+            patch.object(tkn.revoked, 'expires', {}):
+        resp = TEST_CLIENT.post('/logout',
+                                headers={sec.LOGIN_KEY_HEADER: token})
+        assert resp.status_code == OK
+        assert tkn.verify(token) is None
+        resp = TEST_CLIENT.post('/logout',
+                                headers={sec.LOGIN_KEY_HEADER: token})
+        assert resp.status_code == UNAUTHORIZED
@@ -1,6 +1,7 @@
 # Import the application from your project
 # Make sure this import is correct
 from server.endpoints import app as application
+import security.tokens as tkn
 import sys
 import os
 
@@ -20,4 +21,13 @@ exec(open(activate_this).read(), {'__file__': activate_this})
 os.environ['YOUR_PASSWORD_VARIABLE'] = 'swe2024to25'
 os.environ['CLOUD_MONGO'] = '1'
 
+# Session tokens are signed with SESSION_SECRET, which every worker must
+# share. rebuild.sh writes one to SECRET_FILE on the server, once.
+SECRET_FILE = os.path.expanduser('~/.session_secret')
+if not os.environ.get('SESSION_SECRET') and os.path.exists(SECRET_FILE):
+    with open(SECRET_FILE) as secret_file:
+        os.environ['SESSION_SECRET'] = secret_file.read().strip()
+# fail at startup, not on the first login
+tkn.get_secret()
+
 application